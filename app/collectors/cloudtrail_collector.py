@@ -1,49 +1,33 @@
 # collectors/cloudtrail_collector.py
 
+import gzip
 import json
-from datetime import datetime, timedelta
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 import boto3
-import geoip2.database
 import os
-from typing import Optional  # ✅ 추가
+from botocore.config import Config
+from typing import Iterator, Optional  # ✅ 추가
 
-_geoip_reader = None
-_ip_country_cache: dict[str, Optional[str]] = {}
+from app.collectors.s3_download import (
+    get_download_workers, get_s3_client, iter_common_prefixes, iter_day_prefixes,
+    iter_objects, iter_s3_objects,
+)
+from app.helpers.geoip_utils import GeoInfo, apply_geo, resolve_ips
+from app.helpers.log_envelope import ENVELOPE_FIELD, cloudtrail_envelope
+from app.helpers.log_store import to_naive_utc
 
-def get_geoip_reader():
-    """
-    1) GEOLITE2_DB_PATH 환경 변수에서 상대경로(또는 절대경로)를 읽어옵니다.
-    2) 절대경로가 아니라면, 현재 작업 디렉터리(os.getcwd())를 기준으로 절대경로로 변환합니다.
-    3) 한 번만 geoip2.database.Reader를 생성하여 _geoip_reader에 보관합니다.
-    """
-    global _geoip_reader
-    if _geoip_reader is None:
-        geoip_path = os.getenv("GEOLITE2_DB_PATH")
-        if not geoip_path:
-            raise RuntimeError("환경 변수 GEOLITE2_DB_PATH가 설정되지 않았습니다.")
-        # 상대경로 → 절대경로 변환
-        if not os.path.isabs(geoip_path):
-            geoip_path = os.path.join(os.getcwd(), geoip_path)
-        _geoip_reader = geoip2.database.Reader(geoip_path)
-    return _geoip_reader
+DEFAULT_LOOKUP_WORKERS = 4
+DEFAULT_LOOKUP_TPS = 2.0  # lookup_events는 계정·리전당 초당 2회로 제한됨
+DEFAULT_SLICE_MINUTES = 60
+# lookup_events에는 이벤트가 최대 15분가량 늦게 나타나므로, 이어서 조회할 때 이전 수집 지점보다
+# 이만큼 앞에서부터 다시 조회합니다. 다시 받은 이벤트는 EventId(_id) 중복으로 저장되지 않습니다.
+DEFAULT_LOOKUP_OVERLAP_MINUTES = 15
 
-def lookup_country(ip_addr: Optional[str]) -> Optional[str]:
-    """
-    주어진 IP에 대해 캐시를 먼저 확인하고, 없으면 GeoIP Reader로 조회 후 캐시합니다.
-    조회된 ISO country code(예: "US", "KR")를 반환하며, 실패 시 None 반환.
-    """
-    if not ip_addr:
-        return None
-    if ip_addr in _ip_country_cache:
-        return _ip_country_cache[ip_addr]
-    try:
-        reader = get_geoip_reader()
-        match = reader.country(ip_addr)
-        country_code = match.country.iso_code if (match and match.country.iso_code) else None
-    except Exception:
-        country_code = None
-    _ip_country_cache[ip_addr] = country_code
-    return country_code
 
 def get_boto3_session(access_key: str, secret_key: str, region: str):
     """
@@ -56,18 +40,158 @@ def get_boto3_session(access_key: str, secret_key: str, region: str):
     )
 
 
+def structured_fields(record: dict) -> dict:
+    """
+    파싱된 CloudTrail 레코드에서 조회·집계에 쓰는 필드를 타입을 맞춰 꺼냅니다.
+    EventName, EventSource, AccessKeyId는 lookup_events 응답에 이미 최상위 필드로 있으므로 여기서는 제외합니다.
+    """
+    user = record.get("userIdentity") or {}
+    read_only = record.get("readOnly")
+    if isinstance(read_only, str):
+        read_only = read_only.lower() == "true"
+    return {
+        "principalArn": user.get("arn"),
+        "principalType": user.get("type"),
+        "sourceIPAddress": record.get("sourceIPAddress"),
+        "userAgent": record.get("userAgent"),
+        "errorCode": record.get("errorCode"),
+        "readOnly": read_only,
+    }
+
+
+def enrich_cloudtrail_events(events: list) -> list[dict]:
+    """
+    lookup_events 결과 이벤트 묶음에 country, event_time, env(정규화 필드)를 추가한 사본 목록을 반환합니다.
+    CloudTrailEvent JSON 문자열은 한 번만 파싱해 dict로 저장하고, 주요 필드(structured_fields)는 최상위에 둡니다.
+    읽기 전용 여부는 bool 필드 readOnly 하나로만 저장합니다. (lookup_events 응답의 문자열 ReadOnly는 저장하지 않음)
+    묶음 안의 고유 sourceIPAddress만 한 번에 GeoIP 조회하며,
+    AISAWS 사용자(수집기 자신)의 이벤트는 제외합니다.
+    """
+    enriched = []
+    ip_addrs = []
+    for ev in events:
+        ev_copy = ev.copy()
+        obj = ev_copy.get("CloudTrailEvent")
+        if isinstance(obj, str):
+            try:
+                obj = json.loads(obj)
+            except ValueError:
+                obj = None
+        if isinstance(obj, dict):
+            # Username이 AISAWS인 경우 수집 제외
+            if (obj.get("userIdentity") or {}).get("userName") == "AISAWS":
+                continue
+            ev_copy["CloudTrailEvent"] = obj
+            ev_copy.update(structured_fields(obj))
+        read_only_str = ev_copy.pop("ReadOnly", None)
+        if ev_copy.get("readOnly") is None and isinstance(read_only_str, str):
+            ev_copy["readOnly"] = read_only_str.lower() == "true"
+
+        # EventId를 _id로 사용하여 재수집 시 중복 삽입을 막음
+        if ev_copy.get("EventId"):
+            ev_copy["_id"] = ev_copy["EventId"]
+        # 범위 조회용 UTC 기준 이벤트 시각
+        ev_copy["event_time"] = to_naive_utc(ev_copy["EventTime"]) if ev_copy.get("EventTime") else None
+        ev_copy[ENVELOPE_FIELD] = cloudtrail_envelope(ev_copy)
+        enriched.append(ev_copy)
+        ip_addrs.append(ev_copy.get("sourceIPAddress"))
+
+    # 국가 코드 계산 후 최상위 필드에 저장
+    resolved = resolve_ips(ip_addrs)
+    for ev_copy, ip_addr in zip(enriched, ip_addrs):
+        apply_geo(ev_copy, resolved.get(ip_addr, GeoInfo()))
+    return enriched
+
+
+class RateLimiter:
+    """
+    여러 스레드가 공유하는 간단한 속도 제한기입니다. acquire()는 호출 간격이 1/rate초 이상이 되도록 대기합니다.
+    """
+
+    def __init__(self, rate_per_sec: float):
+        self._interval = 1.0 / rate_per_sec
+        self._lock = threading.Lock()
+        self._next_time = time.monotonic()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def split_time_windows(start_dt: datetime, end_dt: datetime, slice_minutes: int) -> list[tuple[datetime, datetime]]:
+    """[start_dt, end_dt)를 slice_minutes 길이의 하위 구간 목록으로 나눕니다."""
+    step = timedelta(minutes=max(1, slice_minutes))
+    windows = []
+    window_start = start_dt
+    while window_start < end_dt:
+        window_end = min(window_start + step, end_dt)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows
+
+
+_WINDOW_DONE = object()
+
+
+def _put(out_queue: queue.Queue, item, stop: threading.Event) -> None:
+    """소비자가 멈추면(stop) 대기하지 않고 버리도록 timeout을 두고 out_queue에 넣습니다."""
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=1)
+            return
+        except queue.Full:
+            continue
+
+
+def _lookup_window(client, limiter: RateLimiter, window_start: datetime, window_end: datetime,
+                   out_queue: queue.Queue, stop: threading.Event) -> None:
+    """하위 구간 하나를 끝까지 페이지 조회하여 페이지별 이벤트 목록을 out_queue에 넣습니다."""
+    try:
+        next_token = None
+        while not stop.is_set():
+            params = {"StartTime": window_start, "EndTime": window_end, "MaxResults": 50}
+            if next_token:
+                params["NextToken"] = next_token
+            limiter.acquire()
+            resp = client.lookup_events(**params)
+
+            events = resp.get("Events", [])
+            if events:
+                _put(out_queue, events, stop)
+
+            next_token = resp.get("NextToken")
+            if not next_token:
+                break
+    except Exception as e:
+        _put(out_queue, RuntimeError(f"{window_start} ~ {window_end} 조회 실패: {e}"), stop)
+    finally:
+        _put(out_queue, _WINDOW_DONE, stop)
+
+
 def collect_cloudtrail_events(access_key: str, secret_key: str, region: str,
-                              start_date_str: str, end_date_str: str, log_messages: list) -> list:
+                              start_date_str: str, end_date_str: str, log_messages: list,
+                              manifest=None, max_workers: Optional[int] = None) -> Iterator[dict]:
     """
     CloudTrail lookup_events API를 호출하여 주어진 날짜 범위(start_date ~ end_date) 동안의 이벤트를
-    가져와 JSON 리스트로 반환합니다.
+    가져와 country를 붙인 이벤트를 하나씩 반환(yield)하는 제너레이터입니다.
+    조회 구간은 CLOUDTRAIL_SLICE_MINUTES(기본 60분) 단위로 나누어 max_workers개 스레드가 동시에 조회하며,
+    모든 스레드는 CLOUDTRAIL_LOOKUP_TPS(기본 초당 2회) 속도 제한기를 공유합니다.
+    manifest(IngestManifest)가 주어지면 이전 실행의 마지막 EventTime(high-water mark)에서
+    CLOUDTRAIL_LOOKUP_OVERLAP_MINUTES(기본 15분) 앞선 시각부터 조회하고(늦게 전달된 이벤트 포함),
+    전체 조회가 끝나면 새 high-water mark를 적재 대기로 기록합니다.
 
     :param access_key: AWS ACCESS_KEY
     :param secret_key: AWS SECRET_KEY
     :param region: AWS REGION
     :param start_date_str: 시작 날짜 (YYYY-MM-DD)
     :param end_date_str: 종료 날짜 (YYYY-MM-DD)
-    :return: 이벤트 JSON 객체 리스트
+    :param manifest: 증분 수집용 IngestManifest (선택)
+    :param max_workers: 동시 조회 스레드 수 (미지정 시 CLOUDTRAIL_LOOKUP_WORKERS 환경 변수 또는 4)
+    :return: 이벤트 JSON 객체 제너레이터
     """
     try:
         start_dt = datetime.strptime(start_date_str, "%Y-%m-%d")
@@ -78,58 +202,251 @@ def collect_cloudtrail_events(access_key: str, secret_key: str, region: str,
 
     log_messages.append(f"[+] 로그 수집 기간: {start_dt} ~ {end_dt}")
 
+    if max_workers is None:
+        max_workers = int(os.getenv("CLOUDTRAIL_LOOKUP_WORKERS", DEFAULT_LOOKUP_WORKERS))
+    limiter = RateLimiter(float(os.getenv("CLOUDTRAIL_LOOKUP_TPS", DEFAULT_LOOKUP_TPS)))
+    slice_minutes = int(os.getenv("CLOUDTRAIL_SLICE_MINUTES", DEFAULT_SLICE_MINUTES))
+
     session = get_boto3_session(access_key, secret_key, region)
-    client = session.client("cloudtrail")
-
-    log_messages.append("[*] CloudTrail에서 이벤트를 조회 중입니다...")
-
-    events = []
-    next_token = None
-    batch_count = 0
-    while True:
-        if next_token:
-            resp = client.lookup_events(
-                StartTime=start_dt,
-                EndTime=end_dt,
-                MaxResults=50,
-                NextToken=next_token
-            )
+    client = session.client("cloudtrail", config=Config(
+        max_pool_connections=max(10, max_workers),
+        retries={"mode": "adaptive", "max_attempts": 10}
+    ))
+
+    # 이전 수집 지점 이후만 조회 (lookup_events는 최신 이벤트부터 반환하므로
+    # high-water mark는 조회가 끝까지 완료된 경우에만 갱신)
+    # 체크포인트는 [covered_from, last_event_time] 구간을 빠짐없이 수집했다는 뜻이므로,
+    # 요청 시작 시각이 그 구간 안에 있을 때만 이어서 조회 (더 이른 기간 요청은 전체 조회)
+    # 늦게 전달되는 이벤트를 놓치지 않도록 수집 지점보다 overlap만큼 앞에서부터 다시 조회
+    overlap = timedelta(minutes=int(os.getenv("CLOUDTRAIL_LOOKUP_OVERLAP_MINUTES", DEFAULT_LOOKUP_OVERLAP_MINUTES)))
+    query_start = start_dt
+    covered_from = start_dt
+    previous_mark: Optional[datetime] = None
+    previous_ids: list[str] = []
+    checkpoint = manifest.get_checkpoint(region) if manifest is not None else None
+    if (checkpoint and checkpoint.get("last_event_time")
+            and checkpoint.get("covered_from", start_dt) <= start_dt < checkpoint["last_event_time"]):
+        previous_mark = checkpoint["last_event_time"]
+        previous_ids = list(checkpoint.get("last_event_ids", []))
+        query_start = max(start_dt, previous_mark - overlap)
+        covered_from = checkpoint.get("covered_from", start_dt)
+        log_messages.append(f"[+] 이전 수집 지점({previous_mark})의 {overlap} 전부터 이벤트를 조회합니다.")
+        if query_start >= end_dt:
+            log_messages.append("[+] 새로 수집할 이벤트가 없습니다.\n")
+            return
+
+    windows = split_time_windows(query_start, end_dt, slice_minutes)
+    log_messages.append(f"[*] CloudTrail에서 이벤트를 조회 중입니다... "
+                        f"(구간 {len(windows)}개, 동시 조회 {max_workers}개)")
+
+    latest_time: Optional[datetime] = None
+    latest_ids: list[str] = []
+    total_count = 0
+    kept_count = 0
+    failed_windows = 0
+
+    out_queue: queue.Queue = queue.Queue(maxsize=max_workers * 4)
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cloudtrail-lookup") as pool:
+        for window_start, window_end in windows:
+            pool.submit(_lookup_window, client, limiter, window_start, window_end, out_queue, stop)
+
+        try:
+            finished = 0
+            while finished < len(windows):
+                item = out_queue.get()
+                if item is _WINDOW_DONE:
+                    finished += 1
+                    continue
+                if isinstance(item, Exception):
+                    failed_windows += 1
+                    log_messages.append(f"[!] CloudTrail {item}")
+                    continue
+
+                fresh = []
+                for ev in item:
+                    ev_time = to_naive_utc(ev["EventTime"]) if ev.get("EventTime") else None
+                    if ev_time is not None:
+                        if latest_time is None or ev_time > latest_time:
+                            latest_time, latest_ids = ev_time, [ev.get("EventId")]
+                        elif ev_time == latest_time:
+                            latest_ids.append(ev.get("EventId"))
+                    fresh.append(ev)
+
+                total_count += len(fresh)
+                enriched = enrich_cloudtrail_events(fresh)
+                kept_count += len(enriched)
+                yield from enriched
+        finally:
+            stop.set()
+
+    if failed_windows:
+        log_messages.append(f"[!] 조회 실패 구간 {failed_windows}개 - 다음 수집 시 다시 조회합니다.")
+    elif manifest is not None and latest_time is not None:
+        # 겹쳐 다시 조회한 구간에서만 이벤트가 나왔으면 수집 지점을 뒤로 돌리지 않음
+        if previous_mark is not None and latest_time <= previous_mark:
+            if latest_time == previous_mark:
+                previous_ids = list(set(previous_ids).union(latest_ids))
+            latest_time, latest_ids = previous_mark, previous_ids
+        manifest.set_checkpoint(region, latest_time, latest_ids, covered_from)
+
+    log_messages.append(f"[+] 총 이벤트 수: {total_count}건\n")
+    log_messages.append(f"[+] 필터링 후 저장 대상 이벤트 수: {kept_count}건\n")
+
+
+def _trail_record_to_event(record: dict) -> dict:
+    """
+    트레일 전달 파일의 레코드 하나를 lookup_events 응답과 같은 모양의 이벤트로 변환합니다.
+    eventTime 형식이 잘못되었으면 ValueError가 발생합니다.
+    """
+    user = record.get("userIdentity") or {}
+    issuer = (user.get("sessionContext") or {}).get("sessionIssuer") or {}
+    event_time = record.get("eventTime")
+    if event_time:
+        event_time = datetime.strptime(event_time, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+    read_only = record.get("readOnly")
+
+    return {
+        "EventId": record.get("eventID"),
+        "EventName": record.get("eventName"),
+        "ReadOnly": str(read_only).lower() if read_only is not None else None,
+        "AccessKeyId": user.get("accessKeyId"),
+        "EventTime": event_time,
+        "EventSource": record.get("eventSource"),
+        "Username": user.get("userName") or issuer.get("userName") or user.get("principalId"),
+        "Resources": [
+            {"ResourceType": res.get("type"), "ResourceName": res.get("ARN")}
+            for res in record.get("resources") or []
+        ],
+        # 다시 직렬화하지 않고 파싱된 레코드를 그대로 넘김 (enrich_cloudtrail_events가 dict도 받음)
+        "CloudTrailEvent": record,
+    }
+
+
+def find_trail_region_roots(s3, bucket_name: str, prefix: str) -> list[str]:
+    """
+    트레일 전달 경로(prefix/AWSLogs/[o-조직ID/]<account-id>/CloudTrail/<region>/)들을
+    CommonPrefixes 조회만으로 찾아 반환합니다.
+    """
+    if prefix and not prefix.endswith("/"):
+        prefix += "/"
+
+    if re.search(r"(^|/)CloudTrail/[^/]+/$", prefix):
+        return [prefix]
+    if re.search(r"(^|/)CloudTrail/$", prefix):
+        return list(iter_common_prefixes(s3, bucket_name, prefix))
+
+    if re.search(r"(^|/)AWSLogs/$", prefix):
+        aws_logs = prefix
+    else:
+        aws_logs = prefix + "AWSLogs/"
+
+    accounts = []
+    for child in iter_common_prefixes(s3, bucket_name, aws_logs):
+        # 조직 트레일은 AWSLogs/o-xxxx/<account-id>/ 아래에 계정별로 전달됨
+        if child[len(aws_logs):].startswith("o-"):
+            accounts.extend(iter_common_prefixes(s3, bucket_name, child))
         else:
-            resp = client.lookup_events(
-                StartTime=start_dt,
-                EndTime=end_dt,
-                MaxResults=50
-            )
+            accounts.append(child)
 
-        batch = resp.get("Events", [])
-        events.extend(batch)
+    roots = []
+    for account_prefix in accounts:
+        roots.extend(iter_common_prefixes(s3, bucket_name, account_prefix + "CloudTrail/"))
+    return roots
 
-        next_token = resp.get("NextToken")
-        if not next_token:
-            break
 
-    log_messages.append(f"[+] 총 이벤트 수: {len(events)}건\n")
+def collect_cloudtrail_s3_events(access_key: str, secret_key: str, region: str,
+                                 bucket_name: str, prefix: str,
+                                 start_date_str: str, end_date_str: str, log_messages: list,
+                                 max_workers: Optional[int] = None, manifest=None) -> Iterator[dict]:
+    """
+    CloudTrail 트레일이 S3에 전달한 파일(AWSLogs/.../CloudTrail/<region>/YYYY/MM/DD/*.json.gz)을
+    날짜별 접두사로 나열해 동시에 내려받고, 각 레코드를 lookup_events와 같은 모양으로 변환하여
+    country를 붙여 반환(yield)하는 제너레이터입니다. lookup_events로는 볼 수 없는 데이터 이벤트도 포함되며,
+    API 호출 제한 없이 대량으로 수집할 수 있습니다.
+    manifest(IngestManifest)가 주어지면 이미 적재된 파일(같은 ETag)은 건너뜁니다.
 
-    enriched_events: list[dict] = []
-    for ev in events:
-        ev_copy = ev.copy()
-        ip_addr = None
-        raw_str = ev_copy.get("CloudTrailEvent")
-        if raw_str:
-            try:
-                obj = json.loads(raw_str)
-                ip_addr = obj.get("sourceIPAddress")
+    :param access_key: AWS ACCESS_KEY
+    :param secret_key: AWS SECRET_KEY
+    :param region: AWS REGION
+    :param bucket_name: 트레일 전달 S3 버킷명
+    :param prefix: S3 버킷 내 접두사 (트레일 설정의 S3 key prefix)
+    :param start_date_str: 시작 날짜 (YYYY-MM-DD)
+    :param end_date_str: 종료 날짜 (YYYY-MM-DD)
+    :param max_workers: 동시 다운로드 워커 수 (미지정 시 S3_DOWNLOAD_WORKERS 환경 변수 또는 8)
+    :param manifest: 증분 수집용 IngestManifest (선택)
+    :return: 이벤트 JSON 객체 제너레이터
+    """
+    try:
+        start_dt = datetime.strptime(start_date_str, "%Y-%m-%d")
+        end_dt = datetime.strptime(end_date_str, "%Y-%m-%d") + timedelta(days=1)
+    except ValueError:
+        raise ValueError("날짜 형식 오류: YYYY-MM-DD 형태로 입력해야 합니다.")
+
+    log_messages.append(f"[+] 로그 수집 기간: {start_dt} ~ {end_dt}")
+
+    max_workers = get_download_workers(max_workers)
+    session = get_boto3_session(access_key, secret_key, region)
+    s3 = get_s3_client(session, max_workers)
 
-                # Username이 AISAWS인 경우 수집 제외
-                if obj.get("userIdentity", {}).get("userName") == "AISAWS":
+    log_messages.append(f"[*] S3 버킷에서 CloudTrail 파일 목록을 조회 중... ({bucket_name})")
+    roots = find_trail_region_roots(s3, bucket_name, prefix)
+    if not roots:
+        log_messages.append("[!] CloudTrail/<region>/ 경로를 찾지 못했습니다.")
+        return
+
+    skipped = 0
+
+    def iter_new_objects():
+        nonlocal skipped
+        for day_prefix in iter_day_prefixes(roots, start_dt, end_dt):
+            for obj in iter_objects(s3, bucket_name, day_prefix):
+                if manifest is not None and manifest.is_done(obj["Key"], obj.get("ETag")):
+                    skipped += 1
                     continue
+                yield obj
+
+    log_messages.append(f"[*] 트레일 파일 수집 시작... (리전 경로 {len(roots)}개, 동시 다운로드 {max_workers}개)\n")
+    count = 0
+    total_count = 0
+    kept_count = 0
+    for obj, raw_data in iter_s3_objects(s3, bucket_name, iter_new_objects(), log_messages, max_workers):
+        key = obj["Key"]
+        count += 1
+        try:
+            body = gzip.decompress(raw_data) if key.endswith(".gz") else raw_data
+            records = json.loads(body).get("Records", [])
+        except (OSError, EOFError, ValueError) as e:
+            log_messages.append(f"[!] 객체 디코딩 실패: {key} ({e})")
+            continue
+
+        events = []
+        bad_records = 0
+        for record in records:
+            try:
+                ev = _trail_record_to_event(record)
+            except (ValueError, TypeError) as e:
+                # 레코드 하나가 잘못되어도 파일·수집 전체를 멈추지 않고 그 레코드만 건너뜀
+                if not bad_records:
+                    log_messages.append(f"[!] 레코드 변환 실패: {key} (eventTime={record.get('eventTime')!r}, {e})")
+                bad_records += 1
+                continue
+            if ev["EventTime"] is None or not (start_dt <= to_naive_utc(ev["EventTime"]) < end_dt):
+                continue
+            events.append(ev)
+        if bad_records > 1:
+            log_messages.append(f"[!] {key}: 변환 실패 레코드 {bad_records}건 건너뜀")
 
-            except Exception:
-                ip_addr = None
+        total_count += len(events)
+        enriched = enrich_cloudtrail_events(events)
+        kept_count += len(enriched)
+        yield from enriched
 
-        # lookup_country()로 국가 코드 계산 후 최상위 필드에 저장
-        ev_copy["country"] = lookup_country(ip_addr)
-        enriched_events.append(ev_copy)
+        if manifest is not None:
+            manifest.mark_done(bucket_name, key, obj.get("ETag"), len(records))
 
-    log_messages.append(f"[+] 필터링 후 저장 대상 이벤트 수: {len(enriched_events)}건\n")
-    return enriched_events
\ No newline at end of file
+    if skipped:
+        log_messages.append(f"[+] 이미 수집된 트레일 파일 {skipped}개는 건너뜀")
+    log_messages.append(f"[+] 총 수집된 트레일 파일 수: {count}")
+    log_messages.append(f"[+] 총 이벤트 수: {total_count}건\n")
+    log_messages.append(f"[+] 필터링 후 저장 대상 이벤트 수: {kept_count}건\n")
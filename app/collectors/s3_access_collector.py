@@ -1,52 +1,19 @@
 # collectors/s3_access_collector.py
 
-import gzip
-import io
-import shlex
 import re
 from datetime import datetime, timedelta
 import boto3
-import geoip2.database
-import os
-from typing import Optional
+from typing import Iterator, Optional
 
-_geoip_reader = None
-_ip_country_cache: dict[str, Optional[str]] = {}
+from app.collectors.s3_access_parser import parse_s3_log_line
+from app.collectors.s3_download import (
+    get_download_workers, get_s3_client, iter_common_prefixes, iter_day_prefixes,
+    iter_object_lines, iter_objects, iter_s3_objects,
+)
+from app.helpers.geoip_utils import enrich_batch
+from app.helpers.ingest_manifest import make_record_id
+from app.helpers.log_envelope import ENVELOPE_FIELD, s3_access_envelope
 
-def get_geoip_reader():
-    """
-    1) GEOLITE2_DB_PATH 환경 변수에서 상대경로(또는 절대경로)를 읽어옵니다.
-    2) 절대경로가 아니라면, 현재 작업 디렉터리(os.getcwd())를 기준으로 절대경로로 변환합니다.
-    3) 한 번만 geoip2.database.Reader를 생성하여 _geoip_reader에 보관합니다.
-    """
-    global _geoip_reader
-    if _geoip_reader is None:
-        geoip_path = os.getenv("GEOLITE2_DB_PATH")
-        if not geoip_path:
-            raise RuntimeError("환경 변수 GEOLITE2_DB_PATH가 설정되지 않았습니다.")
-        # 상대경로 → 절대경로로 변환
-        if not os.path.isabs(geoip_path):
-            geoip_path = os.path.join(os.getcwd(), geoip_path)
-        _geoip_reader = geoip2.database.Reader(geoip_path)
-    return _geoip_reader
-
-def lookup_country(ip_addr: Optional[str]) -> Optional[str]:
-    """
-    주어진 IP에 대해 캐시를 먼저 확인하고, 없으면 GeoIP Reader로 조회 후 캐시합니다.
-    조회된 ISO country code(예: "US", "KR")를 반환하며, 실패 시 None 반환.
-    """
-    if not ip_addr:
-        return None
-    if ip_addr in _ip_country_cache:
-        return _ip_country_cache[ip_addr]
-    try:
-        reader = get_geoip_reader()
-        match = reader.country(ip_addr)
-        country_code = match.country.iso_code if (match and match.country.iso_code) else None
-    except Exception:
-        country_code = None
-    _ip_country_cache[ip_addr] = country_code
-    return country_code
 
 def get_boto3_session(access_key: str, secret_key: str, region: str):
     """
@@ -59,71 +26,64 @@ def get_boto3_session(access_key: str, secret_key: str, region: str):
     )
 
 
-def parse_s3_log_line(line: str) -> Optional[dict]:
-    parts = shlex.split(line)
-    if len(parts) < 18:
-        return None
+# 단순 키 형식: [prefix]YYYY-mm-DD-HH-MM-SS-UniqueString
+_SIMPLE_KEY_RE = re.compile(r"^\d{4}-\d{2}-\d{2}-")
+# 날짜 파티션 형식: [prefix][SourceAccountId]/[SourceRegion]/[SourceBucket]/YYYY/MM/DD/YYYY-mm-DD-...
+_PARTITIONED_KEY_RE = re.compile(r"^[^/]+/[^/]+/[^/]+/\d{4}/\d{2}/\d{2}/")
+
+
+def iter_access_log_objects(s3, bucket_name: str, prefix: str,
+                            start_dt: datetime, end_dt: datetime, log_messages: list) -> Iterator[dict]:
+    """
+    Access Log 키 형식을 확인한 뒤 [start_dt, end_dt) 범위의 객체(Key, ETag 등)만 나열합니다.
+    - 단순 형식: 키가 날짜로 시작하므로 StartAfter로 시작일부터 조회하고 종료일에 도달하면 멈춥니다.
+    - 날짜 파티션 형식: 계정/리전/버킷 경로를 찾은 뒤 날짜별 접두사(YYYY/MM/DD/)만 조회합니다.
+    그 외 형식은 접두사 전체를 조회하며 키 안의 날짜로 필터링합니다.
+    """
+    start_str = start_dt.strftime("%Y-%m-%d")
+    end_str = end_dt.strftime("%Y-%m-%d")
+    probe = s3.list_objects_v2(Bucket=bucket_name, Prefix=prefix, MaxKeys=1).get("Contents", [])
+    first_key = probe[0]["Key"][len(prefix):] if probe else ""
+
+    if _SIMPLE_KEY_RE.match(first_key):
+        for obj in iter_objects(s3, bucket_name, prefix, start_after=prefix + start_str):
+            log_date = obj["Key"][len(prefix):len(prefix) + 10]
+            if log_date >= end_str:
+                return
+            yield obj
+        return
+
+    if _PARTITIONED_KEY_RE.match(first_key):
+        roots = [prefix]
+        for _ in range(3):  # SourceAccountId / SourceRegion / SourceBucket
+            roots = [child for root in roots for child in iter_common_prefixes(s3, bucket_name, root)]
+        for day_prefix in iter_day_prefixes(roots, start_dt, end_dt):
+            yield from iter_objects(s3, bucket_name, day_prefix)
+        return
+
+    if probe:
+        log_messages.append("[!] 알 수 없는 키 형식이므로 접두사 전체를 조회합니다.")
+    for obj in iter_objects(s3, bucket_name, prefix):
+        key = obj["Key"]
+
+        # Key 안에서 YYYY-MM-DD 패턴을 찾아 날짜 판별
+        m = re.search(r"(\d{4}-\d{2}-\d{2})", key)
+        if m and start_str <= m.group(1) < end_str:
+            yield obj
 
-    def to_int(x):
-        try:
-            return int(x)
-        except:
-            return x
-
-    time_raw = parts[2]
-    # +0000이 parts[3]에 잘못 붙은 경우 고려
-    if time_raw.startswith("[") and parts[3].startswith("+"):
-        time_combined = f"{time_raw} {parts[3]}"
-        try:
-            dt = datetime.strptime(time_combined.strip("[]"), "%d/%b/%Y:%H:%M:%S %z")
-            iso_time = dt.isoformat()
-        except:
-            iso_time = time_raw
-    else:
-        iso_time = time_raw
-
-
-    remote_ip = parts[3]
-    requester = parts[4]
-
-    # remote_ip가 잘못된 경우에만 requester의 IP를 대체로 사용
-    if remote_ip.startswith("+") or remote_ip == "-":
-        remote_ip = requester if re.match(r"\d+\.\d+\.\d+\.\d+", requester) else None
-
-
-    user_agent = parts[16] if parts[16] != "-" else None
-    version_id = parts[17] if parts[17] != "-" else None
-    if version_id and version_id.startswith("Mozilla"):
-        user_agent = version_id
-        version_id = None
-
-    return {
-        "bucket_owner": parts[0],
-        "bucket": parts[1],
-        "time": iso_time,
-        "remote_ip": remote_ip,
-        "requester": requester,
-        "request_id": parts[5],
-        "operation": parts[6],
-        "key": parts[7] if parts[7] != "-" else None,
-        "request_uri": parts[8],
-        "http_status": parts[9],
-        "status_code": parts[10] if parts[10] != "-" else None,
-        "bytes_sent": to_int(parts[11]),
-        "object_size": to_int(parts[12]),
-        "total_time": to_int(parts[13]),
-        "turnaround_time": to_int(parts[14]),
-        "referrer": parts[15] if parts[15] != "-" else None,
-        "user_agent": user_agent,
-        "version_id": version_id
-    }
 
 def collect_s3_access_logs(access_key: str, secret_key: str, region: str,
                            bucket_name: str, prefix: str,
-                           start_date_str: str, end_date_str: str, log_messages: list) -> list:
+                           start_date_str: str, end_date_str: str, log_messages: list,
+                           max_workers: Optional[int] = None, manifest=None) -> Iterator[dict]:
     """
     지정된 S3 버킷(bucket_name)에서 Access Log 파일들을 날짜 필터링 후 다운로드하여,
-    한 줄씩 parse_s3_log_line을 거쳐 파싱된 레코드 리스트를 반환합니다.
+    한 줄씩 parse_s3_log_line을 거쳐 파싱된 레코드를 하나씩 반환(yield)하는 제너레이터입니다.
+    객체 다운로드는 최대 max_workers개씩 동시에 진행되며, 객체는 줄 단위로 압축 해제되므로
+    메모리 사용량은 수집 기간과 무관합니다.
+    manifest(IngestManifest)가 주어지면 이미 적재된 객체(같은 ETag)는 건너뛰고,
+    객체 하나를 끝까지 반환할 때마다 manifest에 적재 대기로 기록합니다.
+    각 레코드의 _id는 객체 키와 줄 번호로 정해지므로 재수집 시 중복 삽입되지 않습니다.
 
     :param access_key: AWS ACCESS_KEY
     :param secret_key: AWS SECRET_KEY
@@ -132,7 +92,9 @@ def collect_s3_access_logs(access_key: str, secret_key: str, region: str,
     :param prefix: S3 버킷 내 접두사 (예: "logs/s3/")
     :param start_date_str: 시작 날짜 (YYYY-MM-DD)
     :param end_date_str: 종료 날짜 (YYYY-MM-DD)
-    :return: 파싱된 레코드 딕셔너리 리스트
+    :param max_workers: 동시 다운로드 워커 수 (미지정 시 S3_DOWNLOAD_WORKERS 환경 변수 또는 8)
+    :param manifest: 증분 수집용 IngestManifest (선택)
+    :return: 파싱된 레코드 딕셔너리 제너레이터
     """
     try:
         start_dt = datetime.strptime(start_date_str, "%Y-%m-%d")
@@ -143,55 +105,48 @@ def collect_s3_access_logs(access_key: str, secret_key: str, region: str,
 
     log_messages.append(f"[+] 로그 수집 기간: {start_dt} ~ {end_dt}")
 
+    max_workers = get_download_workers(max_workers)
     session = get_boto3_session(access_key, secret_key, region)
-    s3 = session.client("s3")
+    s3 = get_s3_client(session, max_workers)
 
-    paginator = s3.get_paginator("list_objects_v2")
     log_messages.append(f"[*] S3 버킷에서 객체 목록을 조회 중... ({bucket_name})")
-    pages = paginator.paginate(Bucket=bucket_name, Prefix=prefix)
+    skipped = 0
 
-    parsed_records = []
-    log_messages.append("[*] 로그 파일 필터링 및 수집 시작...\n")
-    count = 0
-    for page in pages:
-        for obj in page.get("Contents", []):
-            key = obj["Key"]
-
-            # Key 안에서 YYYY-MM-DD 패턴을 찾아 날짜 판별
-            m = re.search(r"(\d{4}-\d{2}-\d{2})", key)
-            if not m:
-                continue
-
-            try:
-                log_date = datetime.strptime(m.group(1), "%Y-%m-%d")
-            except:
-                continue
-
-            if not (start_dt <= log_date < end_dt):
+    def iter_new_objects():
+        nonlocal skipped
+        for obj in iter_access_log_objects(s3, bucket_name, prefix, start_dt, end_dt, log_messages):
+            if manifest is not None and manifest.is_done(obj["Key"], obj.get("ETag")):
+                skipped += 1
                 continue
+            yield obj
 
-            # 대상 파일 다운로드
-            count += 1
-            resp = s3.get_object(Bucket=bucket_name, Key=key)
-            raw_data = resp["Body"].read()
-            if key.endswith(".gz"):
-                with gzip.GzipFile(fileobj=io.BytesIO(raw_data)) as gz:
-                    body = gz.read().decode("utf-8")
-            else:
-                body = raw_data.decode("utf-8")
-
+    log_messages.append(f"[*] 로그 파일 필터링 및 수집 시작... (동시 다운로드 {max_workers}개)\n")
+    count = 0
+    for obj, raw_data in iter_s3_objects(s3, bucket_name, iter_new_objects(), log_messages, max_workers):
+        key = obj["Key"]
+        count += 1
+        recs = []
+        try:
             # 한 줄씩 파싱
-            for line in body.splitlines():
+            for line_no, line in enumerate(iter_object_lines(key, raw_data)):
                 if not line.strip():
                     continue
                 rec = parse_s3_log_line(line)
                 if not rec:
                     continue
 
-                ip_addr = rec.get("requester")
-                rec["country"] = lookup_country(ip_addr)
-
-                parsed_records.append(rec)
-                
-        log_messages.append(f"[+] 총 수집된 로그 파일 수: {count}")
-    return parsed_records
+                rec["_id"] = make_record_id(key, line_no)
+                rec[ENVELOPE_FIELD] = s3_access_envelope(rec)
+                recs.append(rec)
+        except (OSError, EOFError, UnicodeDecodeError) as e:
+            log_messages.append(f"[!] 객체 디코딩 실패: {key} ({e})")
+            continue
+
+        # 객체 단위로 고유 IP만 모아 GeoIP 조회
+        yield from enrich_batch(recs, "remote_ip")
+        if manifest is not None:
+            manifest.mark_done(bucket_name, key, obj.get("ETag"), len(recs))
+
+    if skipped:
+        log_messages.append(f"[+] 이미 수집된 로그 파일 {skipped}개는 건너뜀")
+    log_messages.append(f"[+] 총 수집된 로그 파일 수: {count}")
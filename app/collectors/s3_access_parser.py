@@ -0,0 +1,130 @@
+# collectors/s3_access_parser.py
+
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+# S3 서버 액세스 로그 한 줄의 토큰: [시간], "따옴표 필드"(\" 이스케이프 포함), 공백으로 구분된 일반 필드
+_TOKEN_RE = re.compile(r'\[[^\]]*\]|"(?:[^"\\]|\\.)*"|\S+')
+_ESCAPE_RE = re.compile(r'\\(.)')
+_IPV4_RE = re.compile(r"\d+\.\d+\.\d+\.\d+$")
+
+_MONTHS = {
+    "Jan": "01", "Feb": "02", "Mar": "03", "Apr": "04", "May": "05", "Jun": "06",
+    "Jul": "07", "Aug": "08", "Sep": "09", "Oct": "10", "Nov": "11", "Dec": "12",
+}
+
+# AWS 문서 기준 필드 수 (https://docs.aws.amazon.com/AmazonS3/latest/userguide/LogFormat.html)
+# 신규 필드는 줄 끝에 추가되므로, 오래된 포맷에서 없는 필드는 None으로 채웁니다.
+_MIN_FIELDS = 17  # user_agent까지는 모든 포맷 버전에 존재
+_MAX_FIELDS = 26
+
+_time_cache: dict[str, tuple] = {}
+_TIME_CACHE_SIZE = 4096
+
+
+def _parse_time(token: str) -> tuple:
+    """
+    "[06/Feb/2019:00:00:38 +0000]" 형태의 시간을 (ISO 8601 문자열, UTC 기준 naive datetime)으로 변환합니다.
+    같은 초에 찍힌 줄이 많으므로 결과를 캐시하며, 형식이 맞지 않으면 (원본 토큰, None)을 반환합니다.
+    """
+    parsed = _time_cache.get(token)
+    if parsed is not None:
+        return parsed
+
+    raw = token[1:-1]
+    month = _MONTHS.get(raw[3:6])
+    if (month and len(raw) == 26 and raw[2] == "/" and raw[6] == "/" and raw[11] == ":"
+            and raw[20] == " " and raw[:2].isdigit() and raw[7:11].isdigit()):
+        iso_time = f"{raw[7:11]}-{month}-{raw[:2]}T{raw[12:20]}{raw[21:24]}:{raw[24:26]}"
+        try:
+            dt = datetime.fromisoformat(iso_time)
+        except ValueError:
+            dt = None
+    else:
+        try:
+            dt = datetime.strptime(raw, "%d/%b/%Y:%H:%M:%S %z")
+            iso_time = dt.isoformat()
+        except ValueError:
+            iso_time, dt = token, None
+
+    if dt is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    parsed = (iso_time, dt)
+    if len(_time_cache) >= _TIME_CACHE_SIZE:
+        _time_cache.clear()
+    _time_cache[token] = parsed
+    return parsed
+
+
+def parse_log_time(token: str) -> str:
+    """
+    "[06/Feb/2019:00:00:38 +0000]" 형태의 시간을 ISO 8601 문자열("2019-02-06T00:00:38+00:00")로 변환합니다.
+    형식이 맞지 않으면 원본 토큰을 그대로 반환합니다.
+    """
+    return _parse_time(token)[0]
+
+
+def _unquote(value: str) -> Optional[str]:
+    if value[:1] == '"':
+        value = value[1:-1]
+        if "\\" in value:
+            value = _ESCAPE_RE.sub(r"\1", value)
+    return value if value != "-" else None
+
+
+def _to_int(value: str):
+    if value.isdigit():
+        return int(value)
+    return None if value == "-" else value
+
+
+def parse_s3_log_line(line: str) -> Optional[dict]:
+    """
+    S3 서버 액세스 로그 한 줄을 AWS 로그 문법에 맞춰 토큰화하여 딕셔너리로 반환합니다.
+    "-" 값은 None으로, 바이트/시간 필드는 int로 변환합니다. 필드 수가 모자라면 None을 반환합니다.
+    따옴표 필드 안의 \" 이스케이프는 풀어서 저장합니다. remote_ip가 없으면 IP 형태의 requester를 대신 씁니다.
+    event_time에는 요청 시각을 UTC 기준 datetime으로 넣습니다. (범위 조회용)
+    """
+    p = _TOKEN_RE.findall(line)
+    n = len(p)
+    if n < _MIN_FIELDS:
+        return None
+    if n < _MAX_FIELDS:
+        p.extend(["-"] * (_MAX_FIELDS - n))
+
+    time_token = p[2]
+    iso_time, event_time = _parse_time(time_token) if time_token[:1] == "[" else (time_token, None)
+    remote_ip = p[3] if p[3] != "-" else None
+    requester = p[4] if p[4] != "-" else None
+    if remote_ip is None and requester and _IPV4_RE.match(requester):
+        remote_ip = requester
+    return {
+        "bucket_owner": p[0],
+        "bucket": p[1],
+        "time": iso_time,
+        "event_time": event_time,
+        "remote_ip": remote_ip,
+        "requester": requester,
+        "request_id": p[5],
+        "operation": p[6],
+        "key": p[7] if p[7] != "-" else None,
+        "request_uri": _unquote(p[8]),
+        "http_status": p[9] if p[9] != "-" else None,
+        "status_code": p[10] if p[10] != "-" else None,
+        "bytes_sent": _to_int(p[11]),
+        "object_size": _to_int(p[12]),
+        "total_time": _to_int(p[13]),
+        "turnaround_time": _to_int(p[14]),
+        "referrer": _unquote(p[15]),
+        "user_agent": _unquote(p[16]),
+        "version_id": p[17] if p[17] != "-" else None,
+        "host_id": p[18] if p[18] != "-" else None,
+        "signature_version": p[19] if p[19] != "-" else None,
+        "cipher_suite": p[20] if p[20] != "-" else None,
+        "authentication_type": p[21] if p[21] != "-" else None,
+        "host_header": p[22] if p[22] != "-" else None,
+        "tls_version": p[23] if p[23] != "-" else None,
+        "access_point_arn": p[24] if p[24] != "-" else None,
+        "acl_required": p[25] if p[25] != "-" else None,
+    }
@@ -0,0 +1,120 @@
+# collectors/s3_download.py
+
+import gzip
+import io
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Optional
+
+from botocore.config import Config
+
+DEFAULT_DOWNLOAD_WORKERS = 8
+
+
+def get_download_workers(max_workers: Optional[int] = None) -> int:
+    """
+    동시 다운로드 워커 수를 결정합니다.
+    인자로 받은 값이 없으면 S3_DOWNLOAD_WORKERS 환경 변수, 그것도 없으면 기본값(8)을 사용합니다.
+    """
+    if max_workers is None:
+        try:
+            max_workers = int(os.getenv("S3_DOWNLOAD_WORKERS", DEFAULT_DOWNLOAD_WORKERS))
+        except ValueError:
+            max_workers = DEFAULT_DOWNLOAD_WORKERS
+    return max(1, max_workers)
+
+
+def get_s3_client(session, max_workers: int):
+    """
+    워커 수만큼 HTTP 커넥션을 재사용할 수 있도록 커넥션 풀 크기를 맞춘 S3 클라이언트를 반환합니다.
+    (boto3 클라이언트는 스레드 간 공유가 가능합니다.)
+    """
+    return session.client("s3", config=Config(max_pool_connections=max(10, max_workers)))
+
+
+def iter_common_prefixes(s3, bucket_name: str, prefix: str) -> Iterator[str]:
+    """
+    prefix 바로 아래의 "디렉터리"(CommonPrefixes)만 조회합니다. 객체 목록은 내려받지 않습니다.
+    """
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter="/"):
+        for cp in page.get("CommonPrefixes", []):
+            yield cp["Prefix"]
+
+
+def iter_objects(s3, bucket_name: str, prefix: str, start_after: Optional[str] = None) -> Iterator[dict]:
+    """
+    prefix 아래의 객체 메타데이터(Key, ETag, Size 등)를 키 순서대로 반환합니다.
+    start_after를 지정하면 해당 문자열보다 뒤에 정렬되는 키부터 조회합니다.
+    """
+    paginator = s3.get_paginator("list_objects_v2")
+    params = {"Bucket": bucket_name, "Prefix": prefix}
+    if start_after:
+        params["StartAfter"] = start_after
+    for page in paginator.paginate(**params):
+        yield from page.get("Contents", [])
+
+
+def iter_day_prefixes(roots: Iterable[str], start_dt: datetime, end_dt: datetime,
+                      date_format: str = "%Y/%m/%d/") -> Iterator[str]:
+    """
+    각 root 아래에 [start_dt, end_dt) 범위의 날짜별 접두사(기본 "YYYY/MM/DD/")를 만들어 반환합니다.
+    """
+    for root in roots:
+        day = start_dt
+        while day < end_dt:
+            yield f"{root}{day.strftime(date_format)}"
+            day += timedelta(days=1)
+
+
+def _download(s3, bucket_name: str, key: str) -> bytes:
+    resp = s3.get_object(Bucket=bucket_name, Key=key)
+    return resp["Body"].read()
+
+
+def iter_s3_objects(s3, bucket_name: str, objects: Iterable[dict],
+                    log_messages: list, max_workers: int) -> Iterator[tuple[dict, bytes]]:
+    """
+    list_objects_v2 결과 객체(Key, ETag 등)를 순서대로 받아 최대 max_workers개씩 동시에 다운로드하면서
+    (obj, raw_data)를 반환합니다.
+    objects가 지연 평가되는 iterable(예: list_objects_v2 페이지네이터)이면 목록 조회, 다운로드,
+    호출 측의 파싱이 서로 겹쳐서 진행됩니다.
+    진행 중인 요청 수는 max_workers * 2개로 제한되며, 결과는 objects 순서대로 반환됩니다.
+    다운로드에 실패한 객체는 log_messages에 기록한 뒤 건너뜁니다.
+    """
+    max_in_flight = max_workers * 2
+    pending: deque = deque()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-download") as pool:
+        def drain_one():
+            obj, future = pending.popleft()
+            try:
+                return obj, future.result()
+            except Exception as e:
+                log_messages.append(f"[!] 객체 다운로드 실패: {obj['Key']} ({e})")
+                return obj, None
+
+        for obj in objects:
+            pending.append((obj, pool.submit(_download, s3, bucket_name, obj["Key"])))
+            if len(pending) >= max_in_flight:
+                obj_done, raw_data = drain_one()
+                if raw_data is not None:
+                    yield obj_done, raw_data
+
+        while pending:
+            obj_done, raw_data = drain_one()
+            if raw_data is not None:
+                yield obj_done, raw_data
+
+
+def iter_object_lines(key: str, raw_data: bytes) -> Iterator[str]:
+    """
+    다운로드한 객체를 전체 압축 해제하지 않고 한 줄씩 디코딩하여 반환합니다.
+    키가 .gz로 끝나면 gzip 스트림으로 취급합니다.
+    """
+    stream = gzip.GzipFile(fileobj=io.BytesIO(raw_data)) if key.endswith(".gz") else io.BytesIO(raw_data)
+    with io.TextIOWrapper(stream, encoding="utf-8") as text:
+        for line in text:
+            yield line.rstrip("\r\n")
@@ -1,50 +1,21 @@
 # collectors/vpc_flow_collector.py
 
-import gzip
-import io
+import os
+import re
 from datetime import datetime, timedelta
 import boto3
-import geoip2.database
-import os
-from typing import Optional
+from typing import Iterator, Optional
 
-_geoip_reader = None
-_ip_country_cache: dict[str, Optional[str]] = {}
+from app.collectors.s3_download import (
+    get_download_workers, get_s3_client, iter_common_prefixes, iter_day_prefixes,
+    iter_object_lines, iter_objects, iter_s3_objects,
+)
+from app.collectors.vpc_flow_parser import parse_vpc_flow_lines
+from app.helpers.db_utils import DEFAULT_INSERT_BATCH_SIZE
+from app.helpers.geoip_utils import enrich_batch
+from app.helpers.ingest_manifest import make_record_id
+from app.helpers.log_envelope import ENVELOPE_FIELD, vpc_flow_envelope
 
-def get_geoip_reader():
-    """
-    1) GEOLITE2_DB_PATH 환경 변수에서 상대경로(또는 절대경로)를 읽어옵니다.
-    2) 절대경로가 아니라면, 현재 작업 디렉터리(os.getcwd())를 기준으로 절대경로로 변환합니다.
-    3) 한 번만 geoip2.database.Reader를 생성하여 _geoip_reader에 보관합니다.
-    """
-    global _geoip_reader
-    if _geoip_reader is None:
-        geoip_path = os.getenv("GEOLITE2_DB_PATH")
-        if not geoip_path:
-            raise RuntimeError("환경 변수 GEOLITE2_DB_PATH가 설정되지 않았습니다.")
-        # 상대경로 → 절대경로로 변환
-        if not os.path.isabs(geoip_path):
-            geoip_path = os.path.join(os.getcwd(), geoip_path)
-        _geoip_reader = geoip2.database.Reader(geoip_path)
-    return _geoip_reader
-
-def lookup_country(ip_addr: Optional[str]) -> Optional[str]:
-    """
-    주어진 IP에 대해 캐시를 먼저 확인하고, 없으면 GeoIP Reader로 조회 후 캐시합니다.
-    조회된 ISO country code(예: "US", "KR")를 반환하며, 실패 시 None 반환.
-    """
-    if not ip_addr:
-        return None
-    if ip_addr in _ip_country_cache:
-        return _ip_country_cache[ip_addr]
-    try:
-        reader = get_geoip_reader()
-        match = reader.country(ip_addr)
-        country_code = match.country.iso_code if (match and match.country.iso_code) else None
-    except Exception:
-        country_code = None
-    _ip_country_cache[ip_addr] = country_code
-    return country_code
 
 def get_boto3_session(access_key: str, secret_key: str, region: str):
     """
@@ -57,15 +28,46 @@ def get_boto3_session(access_key: str, secret_key: str, region: str):
     )
 
 
+def find_vpc_region_roots(s3, bucket_name: str, prefix: str) -> list[str]:
+    """
+    VPC Flow Log 기본 경로(prefix/AWSLogs/<account-id>/vpcflowlogs/<region>/)들을
+    CommonPrefixes 조회만으로 찾아 반환합니다. prefix가 이미 그 중간 단계를 가리키면 거기서부터 찾습니다.
+    """
+    if prefix and not prefix.endswith("/"):
+        prefix += "/"
+
+    if re.search(r"(^|/)vpcflowlogs/[^/]+/$", prefix):
+        return [prefix]
+    if re.search(r"(^|/)vpcflowlogs/$", prefix):
+        return list(iter_common_prefixes(s3, bucket_name, prefix))
+
+    if re.search(r"(^|/)AWSLogs/[^/]+/$", prefix):
+        accounts = [prefix]
+    elif re.search(r"(^|/)AWSLogs/$", prefix):
+        accounts = list(iter_common_prefixes(s3, bucket_name, prefix))
+    else:
+        accounts = list(iter_common_prefixes(s3, bucket_name, prefix + "AWSLogs/"))
+
+    roots = []
+    for account_prefix in accounts:
+        roots.extend(iter_common_prefixes(s3, bucket_name, account_prefix + "vpcflowlogs/"))
+    return roots
+
+
 def collect_vpc_flow_logs(access_key: str, secret_key: str, region: str,
                           bucket_name: str, prefix: str,
                           start_date_str: str, end_date_str: str, 
-                          log_messages: list) -> list:
+                          log_messages: list, max_workers: Optional[int] = None,
+                          manifest=None) -> Iterator[dict]:
     """
     지정된 S3 버킷(bucket_name)에서 VPC Flow Log 파일을 날짜별 경로(YYYY/MM/DD)
-    기준으로 필터링 후 다운로드하여, 각 줄을 파싱해 딕셔너리 리스트로 반환합니다.
-    (한 줄 당 14개 필드: version, account-id, interface-id, srcaddr, dstaddr,
-     srcport, dstport, protocol, packets, bytes, start, end, action, log-status)
+    기준으로 필터링 후 다운로드하여, 각 줄을 파싱한 딕셔너리를 하나씩 반환(yield)하는 제너레이터입니다.
+    파일 첫 줄의 헤더로 필드 구성을 판단하므로 사용자 지정 포맷(vpc-id, pkt-srcaddr, tcp-flags,
+    flow-direction 등)도 그대로 저장되며, 키는 하이픈을 밑줄로 바꾼 이름(예: pkt_srcaddr)입니다.
+    헤더가 없으면 기본 14개 필드(version ~ log-status) 순서로 해석합니다.
+    객체 다운로드는 최대 max_workers개씩 동시에 진행되며, 객체는 줄 단위로 압축 해제됩니다.
+    manifest(IngestManifest)가 주어지면 이미 적재된 객체(같은 ETag)는 건너뛰고,
+    객체 하나를 끝까지 반환할 때마다 manifest에 적재 대기로 기록합니다.
 
     :param access_key: AWS ACCESS_KEY
     :param secret_key: AWS SECRET_KEY
@@ -74,7 +76,9 @@ def collect_vpc_flow_logs(access_key: str, secret_key: str, region: str,
     :param prefix: S3 버킷 내 접두사 (예: "logs/vpc/")
     :param start_date_str: 시작 날짜 (YYYY-MM-DD)
     :param end_date_str: 종료 날짜 (YYYY-MM-DD)
-    :return: 파싱된 레코드 딕셔너리 리스트
+    :param max_workers: 동시 다운로드 워커 수 (미지정 시 S3_DOWNLOAD_WORKERS 환경 변수 또는 8)
+    :param manifest: 증분 수집용 IngestManifest (선택)
+    :return: 파싱된 레코드 딕셔너리 제너레이터
     """
     try:
         start_dt = datetime.strptime(start_date_str, "%Y-%m-%d")
@@ -83,81 +87,74 @@ def collect_vpc_flow_logs(access_key: str, secret_key: str, region: str,
         raise ValueError("VPC FlowLog 날짜 형식 오류: YYYY-MM-DD 형태로 입력해야 합니다.")
     log_messages.append(f"[+] 로그 수집 기간: {start_dt} ~ {end_dt}")
 
+    max_workers = get_download_workers(max_workers)
     session = get_boto3_session(access_key, secret_key, region)
-    s3 = session.client("s3")
+    s3 = get_s3_client(session, max_workers)
 
-    paginator = s3.get_paginator("list_objects_v2")
     log_messages.append(f"[*] S3 버킷에서 객체 목록을 조회 중... ({bucket_name})")
-    pages = paginator.paginate(Bucket=bucket_name, Prefix=prefix)
+    roots = find_vpc_region_roots(s3, bucket_name, prefix)
 
-    parsed_records = []
-    count = 0
-    log_messages.append("[*] 로그 파일 필터링 및 수집 시작...\n")
+    def iter_target_objects():
+        if roots:
+            # 날짜별 접두사(.../YYYY/MM/DD/)만 조회하므로 범위 밖의 객체는 나열되지 않음
+            for day_prefix in iter_day_prefixes(roots, start_dt, end_dt):
+                yield from iter_objects(s3, bucket_name, day_prefix)
+            return
 
-    for page in pages:
-        for obj in page.get("Contents", []):
+        log_messages.append("[!] vpcflowlogs/<region>/ 경로를 찾지 못해 접두사 전체를 조회합니다.")
+        for obj in iter_objects(s3, bucket_name, prefix):
             key = obj["Key"]
-            parts = key.split("/")
-            if len(parts) < 4:
-                continue
 
-            # 뒤에서부터 YYYY/MM/DD 형태를 파싱
+            # 경로 안의 YYYY/MM/DD 형태를 파싱
+            m = re.search(r"/(\d{4})/(\d{2})/(\d{2})/", key)
+            if not m:
+                continue
             try:
-                year = int(parts[-5])
-                month = int(parts[-4])
-                day = int(parts[-3])
-                log_date = datetime(year, month, day)
-            except:
+                log_date = datetime(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+            except ValueError:
                 continue
 
-            if not (start_dt <= log_date < end_dt):
+            if start_dt <= log_date < end_dt:
+                yield obj
+
+    skipped = 0
+
+    def iter_new_objects():
+        nonlocal skipped
+        for obj in iter_target_objects():
+            if manifest is not None and manifest.is_done(obj["Key"], obj.get("ETag")):
+                skipped += 1
                 continue
+            yield obj
 
-            count += 1
-            # 대상 파일 다운로드
-            resp = s3.get_object(Bucket=bucket_name, Key=key)
-            raw_data = resp["Body"].read()
-            with gzip.GzipFile(fileobj=io.BytesIO(raw_data)) as gz:
-                content = gz.read().decode("utf-8")
-
-            # 각 줄 파싱 (14개 필드)
-            for line in content.splitlines():
-                if not line.strip():
-                    continue
-                if line.startswith("version") or line.startswith("Version"):
-                    # 헤더가 있으면 스킵
-                    continue
-
-                fields = line.split()
-                if len(fields) < 14:
-                    continue
-
-                try:
-                    rec = {
-                        "version": fields[0],
-                        "account_id": fields[1],
-                        "interface_id": fields[2],
-                        "srcaddr": fields[3],
-                        "dstaddr": fields[4],
-                        "srcport": int(fields[5]),
-                        "dstport": int(fields[6]),
-                        "protocol": fields[7],
-                        "packets": int(fields[8]),
-                        "bytes": int(fields[9]),
-                        "start": int(fields[10]),
-                        "end": int(fields[11]),
-                        "action": fields[12],
-                        "log_status": fields[13]
-                    }
-                except:
-                    continue
-
-                # ── GeoIP 조회 (캐시 적용) ─────────────────────────
-                ip_addr = rec.get("srcaddr")
-                rec["country"] = lookup_country(ip_addr)
-                # ─────────────────────────────────────────────────
-
-                parsed_records.append(rec)
-        log_messages.append(f"[+] 총 수집된 로그 파일 수: {count}")
-
-    return parsed_records
+    count = 0
+    batch_size = int(os.getenv("MONGO_INSERT_BATCH_SIZE", DEFAULT_INSERT_BATCH_SIZE))
+    log_messages.append(f"[*] 로그 파일 필터링 및 수집 시작... (동시 다운로드 {max_workers}개)\n")
+
+    for obj, raw_data in iter_s3_objects(s3, bucket_name, iter_new_objects(), log_messages, max_workers):
+        key = obj["Key"]
+        count += 1
+        try:
+            # 파일 전체를 컬럼 단위로 디코딩 (헤더가 있으면 그 필드 순서를 따름)
+            columns = parse_vpc_flow_lines(iter_object_lines(key, raw_data))
+        except (OSError, EOFError, UnicodeDecodeError) as e:
+            log_messages.append(f"[!] 객체 디코딩 실패: {key} ({e})")
+            continue
+
+        # 레코드 딕셔너리는 저장 배치 크기만큼씩만 만들어 내보냄 (파일 전체는 컬럼으로만 보관)
+        event_times = columns.event_times()
+        for start in range(0, len(columns), batch_size):
+            stop = start + batch_size
+            recs = columns.to_records(start, stop)
+            for rec, line_no, event_time in zip(recs, columns.line_nos[start:stop], event_times[start:stop]):
+                rec["_id"] = make_record_id(key, line_no)
+                rec["event_time"] = event_time
+                rec[ENVELOPE_FIELD] = vpc_flow_envelope(rec)
+            # 배치 단위로 고유 출발지 IP만 모아 GeoIP 조회
+            yield from enrich_batch(recs, "srcaddr")
+        if manifest is not None:
+            manifest.mark_done(bucket_name, key, obj.get("ETag"), len(columns))
+
+    if skipped:
+        log_messages.append(f"[+] 이미 수집된 로그 파일 {skipped}개는 건너뜀")
+    log_messages.append(f"[+] 총 수집된 로그 파일 수: {count}")
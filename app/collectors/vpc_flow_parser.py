@@ -0,0 +1,170 @@
+# collectors/vpc_flow_parser.py
+
+from array import array
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+# 기본(v2) 포맷 필드 순서. S3로 전달된 로그 파일은 첫 줄 헤더에 실제 필드 순서가 들어 있으므로
+# 헤더가 없는 파일에만 이 순서를 사용합니다.
+# (https://docs.aws.amazon.com/vpc/latest/userguide/flow-log-records.html)
+DEFAULT_FIELDS = (
+    "version", "account-id", "interface-id", "srcaddr", "dstaddr",
+    "srcport", "dstport", "protocol", "packets", "bytes",
+    "start", "end", "action", "log-status",
+)
+
+# 정수 배열(array('q'))로 보관하는 필드. 나머지 필드는 문자열 리스트로 보관합니다.
+# version, protocol은 기존 저장 형식과 맞추기 위해 문자열로 둡니다.
+INT_FIELDS = frozenset({
+    "srcport", "dstport", "packets", "bytes", "start", "end",
+    "tcp-flags", "traffic-path",
+})
+
+# 정수 배열에서 "-"(값 없음) 또는 숫자가 아닌 값을 나타내는 값. 포트/바이트/시각에는 음수가 없습니다.
+_MISSING = -1
+
+# 흐름 데이터가 없는 레코드(모든 수치가 "-")는 기존과 같이 저장하지 않습니다.
+_SKIP_STATUSES = frozenset({"NODATA", "SKIPDATA"})
+
+
+def field_to_key(field: str) -> str:
+    """헤더 필드명("pkt-srcaddr")을 저장용 키("pkt_srcaddr")로 바꿉니다."""
+    return field.replace("-", "_")
+
+
+def parse_header(line: str) -> Optional[tuple]:
+    """
+    헤더 줄이면 필드명 튜플을, 데이터 줄이면 None을 반환합니다.
+    데이터 줄의 첫 필드(version)는 항상 숫자이고, 헤더의 필드명은 숫자로 시작하지 않습니다.
+    """
+    fields = line.split()
+    if not fields or fields[0][:1].isdigit():
+        return None
+    return tuple(field.lower() for field in fields)
+
+
+def _int_column(values: tuple) -> array:
+    try:
+        return array("q", map(int, values))
+    except ValueError:
+        pass
+    column = array("q")
+    for value in values:
+        column.append(int(value) if value.isdigit() else _MISSING)
+    return column
+
+
+def _str_column(values: tuple) -> list:
+    if "-" not in values:
+        return list(values)
+    return [None if value == "-" else value for value in values]
+
+
+class FlowLogColumns:
+    """
+    VPC Flow Log 파일 하나를 필드별 컬럼으로 보관합니다.
+    정수 필드는 array('q'), 문자열 필드는 list로 저장하며,
+    레코드 딕셔너리는 저장 직전에 to_records()로 저장 배치 크기만큼씩만 만듭니다.
+    """
+
+    def __init__(self, fields: tuple, line_nos: array, columns: list):
+        self.fields = fields
+        self.keys = tuple(field_to_key(field) for field in fields)
+        self.line_nos = line_nos
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.line_nos)
+
+    def column(self, field: str):
+        """헤더 필드명(예: "srcaddr", "tcp-flags")으로 컬럼을 반환합니다. 없으면 None."""
+        try:
+            return self.columns[self.fields.index(field)]
+        except ValueError:
+            return None
+
+    def event_times(self) -> list:
+        """
+        레코드별 시작 시각(start, 없으면 end)을 UTC 기준 naive datetime 목록으로 반환합니다.
+        한 파일 안의 레코드는 집계 구간이 같아 시각 값이 반복되므로 변환 결과를 재사용합니다.
+        """
+        column = self.column("start")
+        if column is None:
+            column = self.column("end")
+        if column is None:
+            return [None] * len(self)
+
+        converted: dict[int, datetime] = {}
+        times = []
+        for ts in column:
+            dt = converted.get(ts)
+            if dt is None and ts != _MISSING:
+                dt = converted[ts] = datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+            times.append(dt)
+        return times
+
+    def to_records(self, start: int = 0, stop: Optional[int] = None) -> list[dict]:
+        """
+        [start, stop) 구간의 레코드를 딕셔너리 목록으로 변환합니다. 정수 컬럼의 빈 값은 None이 됩니다.
+        저장 배치 크기만큼씩 나눠 부르면 파일 전체의 딕셔너리를 한꺼번에 만들지 않습니다.
+        """
+        columns = [col[start:stop] for col in self.columns]
+        columns = [
+            [None if v == _MISSING else v for v in col] if isinstance(col, array) and _MISSING in col else col
+            for col in columns
+        ]
+        keys = self.keys
+        return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def parse_vpc_flow_lines(lines: Iterable[str]) -> FlowLogColumns:
+    """
+    VPC Flow Log 파일의 줄들을 읽어 컬럼 단위로 디코딩합니다.
+    첫 줄이 헤더이면 그 필드 순서(v3~v5 사용자 지정 포맷 포함)를 따르고, 없으면 기본 v2 순서를 사용합니다.
+    필드 수가 헤더와 다른 줄, NODATA/SKIPDATA 레코드는 건너뜁니다.
+
+    :param lines: 줄 끝 문자가 제거된 로그 줄 이터러블
+    :return: FlowLogColumns (line_nos에는 파일 내 0부터 시작하는 줄 번호가 들어감)
+    """
+    fields = None
+    rows = []
+    line_nos = array("l")
+    for line_no, line in enumerate(lines):
+        if fields is None:
+            if not line.strip():
+                continue
+            fields = parse_header(line)
+            if fields is not None:
+                width = len(fields)
+                continue
+            fields = DEFAULT_FIELDS
+            width = len(fields)
+
+        parts = line.split()
+        if len(parts) != width:
+            continue
+        rows.append(parts)
+        line_nos.append(line_no)
+
+    if fields is None:
+        fields = DEFAULT_FIELDS
+
+    if not rows:
+        return FlowLogColumns(fields, line_nos, [[] for _ in fields])
+
+    raw_columns = list(zip(*rows))
+    del rows
+
+    if "log-status" in fields:
+        statuses = raw_columns[fields.index("log-status")]
+        if not _SKIP_STATUSES.isdisjoint(statuses):
+            keep = [i for i, status in enumerate(statuses) if status not in _SKIP_STATUSES]
+            raw_columns = [tuple(col[i] for i in keep) for col in raw_columns]
+            line_nos = array("l", (line_nos[i] for i in keep))
+
+    columns = [
+        _int_column(values) if field in INT_FIELDS else _str_column(values)
+        for field, values in zip(fields, raw_columns)
+    ]
+    return FlowLogColumns(fields, line_nos, columns)
+
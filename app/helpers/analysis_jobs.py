@@ -0,0 +1,168 @@
+# app/helpers/analysis_jobs.py
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Optional
+
+# 청크 분석(LLM 호출)을 동시에 몇 개까지 Ollama로 보낼지. 모든 분석 작업이 이 풀을 함께 씁니다.
+ANALYZE_WORKERS = max(1, int(os.getenv("ANALYZE_WORKERS", "2")))
+
+# 메모리에 남겨 둘 끝난 작업 수 (오래된 것부터 제거)
+MAX_FINISHED_JOBS = 50
+
+TERMINAL_STATUSES = ("done", "failed", "cancelled")
+
+_pool = ThreadPoolExecutor(max_workers=ANALYZE_WORKERS, thread_name_prefix="analyze")
+_jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """작업이 취소되어 진행을 멈출 때 발생합니다."""
+
+
+class AnalysisJob:
+    """
+    /analyze 요청 하나의 진행 상태입니다.
+    작업 스레드가 청크 요약을 채워 넣고, 상태 조회·SSE 엔드포인트는 version이 바뀔 때마다 snapshot()을 읽습니다.
+    """
+
+    def __init__(self, params: dict, job_id: Optional[str] = None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.params = params
+        self.status = "queued"
+        self.logs_read = 0
+        self.items_analyzed = 0  # 압축 후 LLM으로 넘긴 항목 수 (원본 로그 + 집계 레코드)
+        self.chunks_total: Optional[int] = None  # 로그를 끝까지 읽어야 확정됨
+        self.chunks_cached = 0
+        self.summaries: dict[int, str] = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.version = 0
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def update(self, **fields) -> None:
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+
+    def increment(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+            self.version += 1
+
+    def add_summary(self, index: int, text: str) -> None:
+        with self._lock:
+            self.summaries[index] = text
+            self.version += 1
+
+    def cancel(self) -> bool:
+        """취소를 요청합니다. 이미 끝난 작업이면 False."""
+        if self.status in TERMINAL_STATUSES:
+            return False
+        self._cancel.set()
+        return True
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def snapshot(self, with_summaries: bool = True) -> dict:
+        with self._lock:
+            data = {
+                "job_id": self.job_id,
+                "report_id": self.params.get("report_id"),
+                "status": self.status,
+                "logs_read": self.logs_read,
+                "items_analyzed": self.items_analyzed,
+                "chunks_done": len(self.summaries),
+                "chunks_total": self.chunks_total,
+                "chunks_cached": self.chunks_cached,
+                "result": self.result,
+                "error": self.error,
+                "version": self.version,
+            }
+            if with_summaries:
+                data["summaries"] = [
+                    {"index": index, "summary": self.summaries[index]} for index in sorted(self.summaries)
+                ]
+            return data
+
+
+def submit_job(params: dict, run: Callable[[AnalysisJob], object], job_id: Optional[str] = None) -> AnalysisJob:
+    """
+    작업을 등록하고 별도 스레드에서 run(job)을 실행합니다. run의 반환값이 job.result가 됩니다.
+    job_id를 주면 그 id로 등록합니다. (중단된 작업 재개용)
+    """
+    job = AnalysisJob(params, job_id)
+    with _jobs_lock:
+        _jobs[job.job_id] = job
+        finished = [old_id for old_id, old in _jobs.items() if old.status in TERMINAL_STATUSES]
+        for old_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del _jobs[old_id]
+
+    def target():
+        job.update(status="running")
+        try:
+            result = run(job)
+        except JobCancelled:
+            job.update(status="cancelled")
+            print(f"[INFO] ⏹️ 분석 작업 취소됨: {job.job_id}")
+        except Exception as e:
+            job.update(status="failed", error=str(e))
+            print(f"[ERROR] ❌ 분석 작업 실패: {job.job_id} ({e})")
+        else:
+            job.update(status="cancelled" if job.cancelled else "done", result=result)
+
+    threading.Thread(target=target, name=f"analyze-job-{job.job_id[:8]}", daemon=True).start()
+    return job
+
+
+def get_job(job_id: str) -> Optional[AnalysisJob]:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def run_chunks(job: AnalysisJob, chunks: Iterable[list], analyze_chunk: Callable[[int, list], str]) -> list[str]:
+    """
+    chunks를 공용 워커 풀에서 analyze_chunk(index, chunk)로 병렬 분석하고, 요약을 청크 순서대로 반환합니다.
+    동시에 풀에 올라가는 청크는 워커 수의 두 배까지만 두어 메모리에는 그만큼의 청크만 유지합니다.
+    취소되면 대기 중인 청크는 버리고 JobCancelled를 발생시킵니다. (실행 중인 LLM 호출은 끝날 때까지 기다리지 않음)
+    """
+    max_in_flight = ANALYZE_WORKERS * 2
+    pending = {}
+    count = 0
+
+    def drain(return_when):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            job.add_summary(pending.pop(future), future.result())
+
+    try:
+        for index, chunk in enumerate(chunks):
+            job.check_cancelled()
+            if len(pending) >= max_in_flight:
+                drain(FIRST_COMPLETED)
+                job.check_cancelled()
+            pending[_pool.submit(analyze_chunk, index, chunk)] = index
+            count += 1
+        job.update(chunks_total=count)
+        while pending:
+            drain(FIRST_COMPLETED)
+            job.check_cancelled()
+    finally:
+        for future in pending:
+            future.cancel()
+
+    return [job.summaries[index] for index in range(count)]
@@ -0,0 +1,53 @@
+# app/helpers/chunk_cache.py
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+from pymongo import MongoClient
+
+CACHE_DB = "aisaws"
+CHUNK_SUMMARY_COLLECTION = "chunk_summaries"
+ANALYSIS_RUN_COLLECTION = "analysis_runs"
+
+# 청크 직렬화·검색 방식이 바뀌면 올려서 이전 요약을 재사용하지 않도록 합니다.
+CHUNK_CACHE_VERSION = 4
+
+
+def chunk_cache_key(node_ids: Iterable[str], prompt: str, model: str) -> str:
+    """
+    청크 요약 캐시 키: 청크에 든 로그 id(순서 포함), 프롬프트, 모델로 만든 SHA-256.
+    같은 기간·프롬프트로 다시 분석하면 같은 청크는 같은 키가 됩니다.
+    """
+    payload = json.dumps([CHUNK_CACHE_VERSION, model, prompt, list(node_ids)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_chunk_summary(db_client: MongoClient, key: str) -> Optional[str]:
+    """캐시된 청크 요약을 반환합니다. 없으면 None."""
+    doc = db_client[CACHE_DB][CHUNK_SUMMARY_COLLECTION].find_one({"_id": key}, {"summary": 1})
+    return doc["summary"] if doc else None
+
+
+def put_chunk_summary(db_client: MongoClient, key: str, summary: str, model: str, logs: int) -> None:
+    """청크 요약을 저장합니다. 분석에 실패한 청크는 저장하지 않아야 다음 실행에서 다시 시도됩니다."""
+    db_client[CACHE_DB][CHUNK_SUMMARY_COLLECTION].update_one(
+        {"_id": key},
+        {"$set": {"summary": summary, "model": model, "logs": logs,
+                  "created_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+
+def record_analysis_run(db_client: MongoClient, job_id: str, params: dict, status: str) -> None:
+    """분석 작업의 요청값과 상태를 기록합니다. 앱이 도중에 종료되면 running으로 남아 다음 시작 시 재개됩니다."""
+    db_client[CACHE_DB][ANALYSIS_RUN_COLLECTION].update_one(
+        {"_id": job_id},
+        {"$set": {"params": params, "status": status, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+
+def find_interrupted_runs(db_client: MongoClient) -> list[dict]:
+    """끝나지 않은 채 남은(running) 분석 작업 목록 [{"_id": job_id, "params": {...}}]"""
+    return list(db_client[CACHE_DB][ANALYSIS_RUN_COLLECTION].find({"status": "running"}, {"params": 1}))
@@ -2,12 +2,20 @@
 
 import os
 import json
+import queue
+import threading
+import time
 from pathlib import Path
 from dotenv import load_dotenv
-from app.collectors.cloudtrail_collector import collect_cloudtrail_events
+from app.collectors.cloudtrail_collector import collect_cloudtrail_events, collect_cloudtrail_s3_events
 from app.collectors.s3_access_collector import collect_s3_access_logs
 from app.collectors.vpc_flow_collector import collect_vpc_flow_logs
-from app.helpers.db_utils import get_mongo_client, insert_documents
+from app.helpers.db_utils import DEFAULT_INSERT_BATCH_SIZE, get_mongo_client, insert_documents, iter_batches
+from app.helpers.ingest_manifest import IngestManifest
+from app.helpers.log_indexes import ensure_log_indexes
+from app.helpers.log_rollups import update_rollups
+from app.helpers.log_store import LOG_COLLECTION, TIME_FIELD, record_collected_range
+from app.helpers.summary_cache import invalidate_summaries
 
 '''
 def save_logs_to_file(filename: str, logs: list):
@@ -16,9 +24,99 @@ def save_logs_to_file(filename: str, logs: list):
     with open(path / filename, "w", encoding="utf-8") as f:
         json.dump(logs, f, ensure_ascii=False, indent=2)
 '''
-        
+
+
+def ingest_stream(mongo_client, db_name: str, collection_name: str,
+                  records, log_messages: list, batch_size: int, manifest: IngestManifest = None):
+    """
+    수집기 제너레이터(records)를 batch_size개씩 끊어 곧바로 MongoDB에 삽입하면서,
+    그 사이 수집기가 log_messages에 쌓은 메시지를 스트림으로 흘려보냅니다.
+    메모리에는 한 배치만 유지되므로 수집 기간이 길어도 사용량이 늘지 않습니다.
+    새로 삽입된 문서는 곧바로 시간 단위 집계(log_rollups)에 반영되고, 겹치는 대시보드 요약 캐시는 무효화됩니다.
+    manifest가 주어지면 배치 삽입이 성공할 때마다 그때까지 끝난 객체/체크포인트를 확정합니다.
+    삽입 실패가 한 번이라도 발생하면 이후 확정을 멈춰, 다음 실행에서 해당 구간을 다시 수집하게 합니다.
+    """
+    sent = 0
+    inserted = 0
+    duplicates = 0
+    healthy = True
+
+    def on_inserted(docs: list):
+        # 새로 삽입된 문서만 시간 단위 집계에 반영 (중복 재수집은 집계되지 않음)
+        try:
+            update_rollups(mongo_client, db_name, docs)
+        except Exception as e:
+            log_messages.append(f"[DB ERROR] {db_name} 집계 갱신 실패: {e}")
+        # 이 문서들의 시각 구간과 겹치는 대시보드 요약 캐시 제거
+        times = [doc[TIME_FIELD] for doc in docs if doc.get(TIME_FIELD) is not None]
+        if times:
+            invalidate_summaries(db_name, min(times), max(times))
+
+    for batch in iter_batches(records, batch_size):
+        result = insert_documents(mongo_client, db_name, collection_name, batch, on_inserted=on_inserted)
+        inserted += result["inserted"]
+        duplicates += result["duplicates"]
+        healthy = healthy and result["failed"] == 0
+        if manifest is not None and healthy:
+            manifest.commit()
+        for msg in log_messages[sent:]:
+            yield msg + "\n"
+        sent = len(log_messages)
+        yield f"[DB] {db_name}.{collection_name} 에 {inserted}개 문서 삽입 중...\n"
+
+    if manifest is not None and healthy:
+        manifest.commit()
+    for msg in log_messages[sent:]:
+        yield msg + "\n"
+    if not healthy:
+        yield f"[DB ERROR] {db_name}.{collection_name} 일부 문서 삽입 실패 - 다음 수집 시 다시 시도합니다.\n"
+    yield f"[DB] {db_name}.{collection_name} 에 {inserted}개 문서 삽입 완료. (중복 {duplicates}건 건너뜀)\n"
+
+
+# _run_source()가 실패로 끝난 출처를 알릴 때 큐에 넣는 종료 표시
+_FAILED = object()
+
+
+class StreamLog(list):
+    """
+    수집기에 log_messages로 넘기는 리스트 대용 객체입니다.
+    append()된 메시지를 저장하지 않고 곧바로 큐에 [출처] 접두사를 붙여 넣으므로,
+    여러 수집기가 동시에 돌아도 진행 상황이 발생 순서대로 스트림에 섞여 나갑니다.
+    (항상 비어 있으므로 ingest_stream()이 같은 메시지를 다시 내보내지 않습니다.)
+    """
+
+    def __init__(self, out: queue.Queue, label: str):
+        super().__init__()
+        self._out = out
+        self._label = label
+
+    def append(self, msg: str) -> None:
+        self._out.put((self._label, msg.rstrip("\n") + "\n"))
+
+
+def _run_source(out: queue.Queue, label: str, make_stream) -> None:
+    """
+    출처 하나의 수집·적재 스트림을 끝까지 소비하며 각 줄을 큐에 넣습니다.
+    예외가 나도 다른 출처에 영향을 주지 않도록 오류 줄로 보고하고, 마지막에 (label, None)을 넣습니다.
+    """
+    started = time.monotonic()
+    try:
+        for line in make_stream(StreamLog(out, label)):
+            out.put((label, line))
+        out.put((label, f"✅ 수집 완료 ({time.monotonic() - started:.1f}초)\n"))
+    except Exception as e:
+        out.put((label, f"[ERROR] 수집 실패: {e}\n"))
+        out.put((label, _FAILED))
+        return
+    out.put((label, None))
+
 
 def run_collectors_stream(start_date: str, end_date: str):
+    """
+    S3 Access Log, VPC Flow Log, CloudTrail 수집기를 각각 별도 스레드에서 동시에 실행하고,
+    세 출처의 진행 메시지를 발생하는 대로 "[출처] 메시지" 형태로 섞어 반환(yield)합니다.
+    한 출처가 실패해도 나머지는 계속 수집하며, 마지막에 출처별 성공/실패를 요약합니다.
+    """
     load_dotenv()
 
     ACCESS_KEY = os.getenv("ACCESS_KEY")
@@ -29,47 +127,89 @@ def run_collectors_stream(start_date: str, end_date: str):
     S3_PREFIX = os.getenv("S3_ACCESS_LOG_PREFIX", "")
     VPC_BUCKET = os.getenv("VPC_FLOW_LOG_BUCKET")
     VPC_PREFIX = os.getenv("VPC_FLOW_LOG_PREFIX", "")
+    # 설정되어 있으면 lookup_events API 대신 트레일 S3 전달 파일에서 CloudTrail 이벤트를 수집
+    CLOUDTRAIL_BUCKET = os.getenv("CLOUDTRAIL_BUCKET")
+    CLOUDTRAIL_PREFIX = os.getenv("CLOUDTRAIL_PREFIX", "")
     MONGODB_URI = os.getenv("MONGODB_URI")
+    BATCH_SIZE = int(os.getenv("MONGO_INSERT_BATCH_SIZE", DEFAULT_INSERT_BATCH_SIZE))
 
-    collection_name = f"{start_date}_to_{end_date}"
+    # 수집 기간과 상관없이 출처별 단일 컬렉션에 저장 (같은 이벤트는 같은 _id로 한 번만 저장됨)
+    collection_name = LOG_COLLECTION
     mongo_client = get_mongo_client(MONGODB_URI)
 
-    yield "\n>>> [Step 1] S3 Access Log 수집 시작\n"
-    s3_logs = collect_s3_access_logs(
-        ACCESS_KEY, SECRET_KEY, REGION,
-        S3_BUCKET, S3_PREFIX,
-        start_date, end_date,
-        log_messages := []
-    )
-    for msg in log_messages:
-        yield msg + "\n"
-    insert_documents(mongo_client, "s3accesslog", collection_name, s3_logs)
-    #save_logs_to_file(f"s3accesslog.{collection_name}.json", s3_logs)
-    yield f"[DB] s3accesslog.{collection_name} 에 {len(s3_logs)}개 문서 삽입 완료.\n"
-
-    yield "\n>>> [Step 2] VPC Flow Log 수집 시작\n"
-    vpc_logs = collect_vpc_flow_logs(
-        ACCESS_KEY, SECRET_KEY, REGION,
-        VPC_BUCKET, VPC_PREFIX,
-        start_date, end_date,
-        log_messages := []
-    )
-    for msg in log_messages:
-        yield msg + "\n"
-    insert_documents(mongo_client, "vpcflow", collection_name, vpc_logs)
-    #save_logs_to_file(f"vpcflow.{collection_name}.json", vpc_logs)
-    yield f"[DB] vpcflow.{collection_name} 에 {len(vpc_logs)}개 문서 삽입 완료.\n"
-
-    yield "\n>>> [Step 3] CloudTrail 이벤트 수집 시작\n"
-    ct_logs = collect_cloudtrail_events(
-        ACCESS_KEY, SECRET_KEY, REGION,
-        start_date, end_date,
-        log_messages := []
-    )
-    for msg in log_messages:
-        yield msg + "\n"
-    insert_documents(mongo_client, "cloudtrail", collection_name, ct_logs)
-    #save_logs_to_file(f"cloudtrail.{collection_name}.json", ct_logs)
-    yield f"[DB] cloudtrail.{collection_name} 에 {len(ct_logs)}개 문서 삽입 완료.\n"
+    def s3_stream(log_messages):
+        ensure_log_indexes(mongo_client, "s3accesslog")
+        manifest = IngestManifest(mongo_client, "s3accesslog", collection_name)
+        s3_logs = collect_s3_access_logs(
+            ACCESS_KEY, SECRET_KEY, REGION,
+            S3_BUCKET, S3_PREFIX,
+            start_date, end_date,
+            log_messages,
+            manifest=manifest
+        )
+        return ingest_stream(mongo_client, "s3accesslog", collection_name, s3_logs, log_messages, BATCH_SIZE, manifest)
+
+    def vpc_stream(log_messages):
+        ensure_log_indexes(mongo_client, "vpcflow")
+        manifest = IngestManifest(mongo_client, "vpcflow", collection_name)
+        vpc_logs = collect_vpc_flow_logs(
+            ACCESS_KEY, SECRET_KEY, REGION,
+            VPC_BUCKET, VPC_PREFIX,
+            start_date, end_date,
+            log_messages,
+            manifest=manifest
+        )
+        return ingest_stream(mongo_client, "vpcflow", collection_name, vpc_logs, log_messages, BATCH_SIZE, manifest)
+
+    def cloudtrail_stream(log_messages):
+        ensure_log_indexes(mongo_client, "cloudtrail")
+        manifest = IngestManifest(mongo_client, "cloudtrail", collection_name)
+        if CLOUDTRAIL_BUCKET:
+            ct_logs = collect_cloudtrail_s3_events(
+                ACCESS_KEY, SECRET_KEY, REGION,
+                CLOUDTRAIL_BUCKET, CLOUDTRAIL_PREFIX,
+                start_date, end_date,
+                log_messages,
+                manifest=manifest
+            )
+        else:
+            ct_logs = collect_cloudtrail_events(
+                ACCESS_KEY, SECRET_KEY, REGION,
+                start_date, end_date,
+                log_messages,
+                manifest=manifest
+            )
+        return ingest_stream(mongo_client, "cloudtrail", collection_name, ct_logs, log_messages, BATCH_SIZE, manifest)
+
+    sources = {
+        "S3 AccessLog": s3_stream,
+        "VPC FlowLog": vpc_stream,
+        "CloudTrail": cloudtrail_stream,
+    }
+
+    yield f"\n>>> {', '.join(sources)} 수집을 동시에 시작합니다\n"
+    out: queue.Queue = queue.Queue()
+    failed = []
+    # 브라우저 연결이 끊겨도 진행 중인 수집·적재는 끝까지 마치도록 데몬이 아닌 스레드로 실행
+    workers = [
+        threading.Thread(target=_run_source, args=(out, label, make_stream), name=f"collector-{label}")
+        for label, make_stream in sources.items()
+    ]
+    for worker in workers:
+        worker.start()
+
+    running = len(workers)
+    while running:
+        label, line = out.get()
+        if line is None or line is _FAILED:
+            running -= 1
+            if line is _FAILED:
+                failed.append(label)
+            continue
+        yield f"[{label}] {line.lstrip(chr(10))}"
 
-    yield "\n=== ✅ 모든 로그 수집 및 MongoDB 저장 완료 ===\n"
+    record_collected_range(mongo_client, start_date, end_date)
+    if failed:
+        yield f"\n=== ⚠️ 일부 로그 수집 실패: {', '.join(failed)} (나머지는 MongoDB 저장 완료) ===\n"
+    else:
+        yield "\n=== ✅ 모든 로그 수집 및 MongoDB 저장 완료 ===\n"
@@ -1,7 +1,20 @@
 # db_utils.py
 
-import json
+import os
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional
+from bson import Decimal128, ObjectId
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+
+DEFAULT_INSERT_BATCH_SIZE = 1000
+
+# 변환 없이 BSON으로 인코딩되는 스칼라 타입 (bool은 int의 하위 타입)
+_BSON_SCALARS = (str, int, float, datetime, bytes, ObjectId, Decimal128)
 
 
 def get_mongo_client(mongodb_uri: str) -> MongoClient:
@@ -11,65 +24,113 @@ def get_mongo_client(mongodb_uri: str) -> MongoClient:
     return MongoClient(mongodb_uri)
 
 
-def insert_documents(db_client: MongoClient, db_name: str, collection_name: str, documents: list) -> None:
+def get_write_concern(w: Optional[str] = None) -> WriteConcern:
+    """
+    삽입에 사용할 write concern을 만듭니다.
+    w를 지정하지 않으면 MONGO_WRITE_CONCERN 환경 변수(예: "1", "majority", "0")를 사용하며, 기본값은 1입니다.
+    MONGO_WRITE_JOURNAL=true이면 저널 기록까지 기다립니다.
+    """
+    if w is None:
+        w = os.getenv("MONGO_WRITE_CONCERN", "1")
+    journal = os.getenv("MONGO_WRITE_JOURNAL", "").lower() in ("1", "true", "yes")
+    return WriteConcern(w=int(w) if w.isdigit() else w, j=journal or None)
+
+
+def to_bson_value(value):
+    """
+    BSON으로 바로 인코딩되지 않는 값만 변환합니다. datetime은 그대로 두어 MongoDB Date로 저장됩니다.
+    (date → 자정 datetime, set/tuple/array → list, Decimal → Decimal128, 그 밖의 알 수 없는 타입 → str)
+    """
+    if value is None or isinstance(value, _BSON_SCALARS):
+        return value
+    if isinstance(value, dict):
+        return to_bson_document(value)
+    if isinstance(value, (list, tuple, set, frozenset, array)):
+        return [to_bson_value(v) for v in value]
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, Decimal):
+        return Decimal128(value)
+    return str(value)
+
+
+def to_bson_document(doc: dict) -> dict:
+    """
+    문서의 모든 값이 BSON 기본 타입이면 원본을 그대로, 아니면 변환한 사본을 반환합니다.
+    수집기가 만드는 레코드는 대부분 문자열/정수/datetime뿐이므로 복사 없이 통과합니다.
+    """
+    for value in doc.values():
+        if value is not None and not isinstance(value, _BSON_SCALARS):
+            break
+    else:
+        return doc
+    return {str(k): to_bson_value(v) for k, v in doc.items()}
+
+
+def insert_documents(db_client: MongoClient, db_name: str, collection_name: str, documents: list,
+                     batch_size: Optional[int] = None, write_concern: Optional[WriteConcern] = None,
+                     on_inserted: Optional[Callable[[list], None]] = None) -> dict:
     """
     지정된 MongoDB(db_name)의 collection_name에 documents(list of dict)를 삽입합니다.
-    내부에 datetime 객체 등이 있을 경우, BSON 인코딩이 되지 않기 때문에
-    JSON 직렬화를 거쳐 삽입하도록 합니다.
+    datetime은 문자열로 바꾸지 않고 BSON Date로 그대로 저장하며, BSON이 지원하지 않는 값만 변환합니다.
+    batch_size개씩 나눠 순서 없는(unordered) insert_many로 보내므로,
+    _id가 이미 있는 문서(재수집)나 일부 실패 문서가 있어도 나머지는 계속 삽입됩니다.
 
     :param db_client: MongoClient 객체
     :param db_name: 데이터베이스 이름 (예: "cloudtrail", "s3accesslog", "vpcflow")
-    :param collection_name: 컬렉션 이름 (예: "2025-05-20_to_2025-05-22")
+    :param collection_name: 컬렉션 이름 (예: "logs")
     :param documents: 삽입할 문서 리스트 (각각 dict)
+    :param batch_size: insert_many 한 번에 보낼 문서 수 (미지정 시 MONGO_INSERT_BATCH_SIZE 환경 변수 또는 1000)
+    :param write_concern: 사용할 WriteConcern (미지정 시 get_write_concern())
+    :param on_inserted: 청크마다 실제로 새로 삽입된 문서 목록을 받는 콜백 (중복·실패 문서 제외, 집계 갱신용)
+    :return: {"inserted": 삽입 건수, "duplicates": 중복으로 건너뛴 건수, "failed": 실패 건수}
+             (w=0이면 서버 응답이 없으므로 보낸 건수를 inserted로 셉니다.)
     """
+    result = {"inserted": 0, "duplicates": 0, "failed": 0}
     if not documents:
         print(f"[DB] {db_name}.{collection_name} 에 삽입할 문서가 없습니다.")
-        return
-
-    db = db_client[db_name]
-    coll = db[collection_name]
-
-    # datetime이나 다른 non-serializable 객체가 있으면 json.dumps로 처리
-    to_insert = []
-    for doc in documents:
-        to_insert.append(json.loads(json.dumps(doc, default=str)))
-
-    try:
-        coll.insert_many(to_insert)
-        print(f"[DB] {db_name}.{collection_name} 에 {len(to_insert)}개 문서 삽입 완료.")
-    except Exception as e:
-        print(f"[DB ERROR] {db_name}.{collection_name} 삽입 실패: {e}")
-
-
-from datetime import datetime, timedelta
-
-def extract_dates_from_report_id(report_id: str):
-    try:
-        _, start_str, end_str = report_id.split("_")
-        return start_str, end_str
-    except:
-        return None, None
-
-def get_logs_by_report_id(mongodb_uri: str, report_id: str) -> list:
+        return result
+
+    if batch_size is None:
+        batch_size = int(os.getenv("MONGO_INSERT_BATCH_SIZE", DEFAULT_INSERT_BATCH_SIZE))
+    if write_concern is None:
+        write_concern = get_write_concern()
+    coll = db_client[db_name].get_collection(collection_name, write_concern=write_concern)
+
+    for chunk in iter_batches(documents, batch_size):
+        to_insert = [to_bson_document(doc) for doc in chunk]
+        try:
+            coll.insert_many(to_insert, ordered=False)
+            result["inserted"] += len(to_insert)
+            if on_inserted is not None:
+                on_inserted(to_insert)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            inserted = e.details.get("nInserted", 0)
+            duplicates = sum(1 for err in write_errors if err.get("code") == 11000)
+            result["inserted"] += inserted
+            result["duplicates"] += duplicates
+            result["failed"] += len(to_insert) - inserted - duplicates
+            if on_inserted is not None and inserted:
+                rejected = {err.get("index") for err in write_errors}
+                on_inserted([doc for i, doc in enumerate(to_insert) if i not in rejected])
+        except Exception as e:
+            result["failed"] += len(to_insert)
+            print(f"[DB ERROR] {db_name}.{collection_name} 삽입 실패: {e}")
+
+    print(f"[DB] {db_name}.{collection_name} 에 {result['inserted']}개 문서 삽입 "
+          f"(중복 {result['duplicates']}건 건너뜀, 실패 {result['failed']}건)")
+    return result
+
+
+def iter_batches(documents: Iterable[dict], batch_size: int = DEFAULT_INSERT_BATCH_SIZE) -> Iterator[list]:
     """
-    report_id로부터 start, end 날짜를 추출하여 각 DB에서 로그를 조회합니다.
-    각 DB는 cloudtrail, vpcflow, s3accesslog이며, 컬렉션은 yyyy-mm-dd_to_yyyy-mm-dd 형식입니다.
+    documents(제너레이터 등)를 batch_size개씩 끊어 리스트로 반환합니다.
+    전체를 메모리에 올리지 않고 배치 단위로 MongoDB에 흘려 넣을 때 사용합니다.
     """
-    client = get_mongo_client(mongodb_uri)
-    start, end = extract_dates_from_report_id(report_id)
-    if not start or not end:
-        return []
-
-    collection_name = f"{start[:4]}-{start[4:6]}-{start[6:]}_to_{end[:4]}-{end[4:6]}-{end[6:]}"
-    db_names = ["cloudtrail", "vpcflow", "s3accesslog"]
-    all_logs = []
-
-    for db_name in db_names:
-        db = client[db_name]
-        coll = db[collection_name]
-        logs = list(coll.find({}, {"_id": 0}))
-        for log in logs:
-            log["log_type"] = db_name
-        all_logs.extend(logs)
-
-    return all_logs
\ No newline at end of file
+    iterator = iter(documents)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
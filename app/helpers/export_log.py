@@ -1,12 +1,18 @@
 # export_log.py
 
+import base64
+import heapq
 import json
+from itertools import islice
+from operator import itemgetter
+from typing import Iterable, Iterator, Optional
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
 from bson import ObjectId
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from app.helpers.log_store import LOG_COLLECTION, LOG_SOURCES, TIME_FIELD, get_log_collection, time_range_filter
 
 # ✅ 환경 변수에서 Mongo URI 불러오기
 load_dotenv()
@@ -25,46 +31,143 @@ def convert_for_json(obj):
     else:
         return obj
 
-# ✅ 시간 필드 매핑
-SORT_FIELDS = {
-    "cloudtrail": "EventTime",
-    "vpcflow": "start",
-    "s3accesslog": "time"
-}
 
-# ✅ 메인 함수
-def export_logs(start: str, end: str) -> dict:
+def _iter_source(client: MongoClient, db_name: str, query: dict, label: str) -> Iterator[tuple]:
+    """
+    출처 하나의 로그를 event_time 오름차순으로 한 건씩 (event_time, 출처, 문서)로 내보냅니다.
+    조회 도중 오류가 나면 출력한 뒤 다시 발생시킵니다. 일부만 읽은 로그로 분석이 끝난 것처럼
+    처리되어 요약이 캐시되지 않도록, 병합 스트림을 읽는 쪽(분석 작업)이 실패로 끝나야 합니다.
+    """
+    count = 0
+    # 청크 분석(LLM 호출) 사이에 커서가 오래 쉬어도 서버에서 닫히지 않도록 no_cursor_timeout 사용, 끝나면 직접 닫음
+    # _id는 벡터 저장소 노드 id(출처:_id)로 쓰이므로 포함
+    cursor = get_log_collection(client, db_name).find(
+        query, no_cursor_timeout=True
+    ).sort(TIME_FIELD, 1)
+    try:
+        for doc in cursor:
+            count += 1
+            yield doc[TIME_FIELD], db_name, doc
+        print(f"✅ {db_name}.{LOG_COLLECTION} [{label}] → {count}건 수집")
+    except Exception as e:
+        print(f"⚠️ {db_name}.{LOG_COLLECTION} [{label}] → {count}건 이후 수집 실패: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def iter_merged_logs(start: str, end: str) -> Iterator[tuple]:
+    """
+    [start, end] 기간(event_time 기준)의 모든 출처 로그를 시간순으로 하나씩 내보내는 지연 이터레이터.
+    출처별 커서가 이미 event_time 순으로 정렬되어 있으므로 heapq.merge로 병합만 하며,
+    메모리에는 출처마다 커서 배치 하나만 유지됩니다. 시각이 같으면 LOG_SOURCES 순서를 따릅니다.
+
+    :return: (출처, JSON 직렬화 가능한 로그 dict) 이터레이터. 연결 실패 시 아무것도 내보내지 않으며,
+             조회 도중 오류는 그대로 발생시킴
+    """
     try:
         client = MongoClient(MONGODB_URI)
         client.admin.command('ping')  # 연결 확인
     except ConnectionFailure as e:
         print(f"❌ MongoDB 연결 실패: {e}")
-        return {}
+        return
 
-    collection_name = f"{start}_to_{end}"
-    log_sources = ["cloudtrail", "vpcflow", "s3accesslog"]
-    logs = {}
+    query = time_range_filter(start, end)
+    label = f"{start} ~ {end}"
+    streams = [_iter_source(client, db_name, query, label) for db_name in LOG_SOURCES]
+    merged = heapq.merge(*streams, key=itemgetter(0))
+    try:
+        for _, db_name, doc in merged:
+            yield db_name, convert_for_json(doc)
+    finally:
+        for stream in streams:
+            stream.close()
+        client.close()
 
-    for db_name in log_sources:
-        try:
-            db = client[db_name]
-            collection = db[collection_name]
-            sort_field = SORT_FIELDS.get(db_name, None)
 
-            if sort_field:
-                cursor = collection.find({}, {"_id": 0}).sort(sort_field, 1)  # 오름차순 정렬
-            else:
-                cursor = collection.find({}, {"_id": 0})  # 정렬 필드가 없을 경우
+def extract_dates_from_report_id(report_id: str):
+    try:
+        _, start_str, end_str = report_id.split("_")
+        return start_str, end_str
+    except:
+        return None, None
+
+
+def report_time_filter(report_id: str) -> Optional[dict]:
+    """
+    report_id("report_YYYYMMDD_YYYYMMDD")의 기간을 event_time 범위 조건으로 바꿉니다.
+    형식이 맞지 않으면 None을 반환합니다.
+    """
+    start, end = extract_dates_from_report_id(report_id)
+    if not start or not end:
+        return None
+    try:
+        return time_range_filter(f"{start[:4]}-{start[4:6]}-{start[6:]}", f"{end[:4]}-{end[4:6]}-{end[6:]}")
+    except ValueError:
+        return None
 
-            result = list(cursor)
-            logs[db_name] = convert_for_json(result)
-            print(f"✅ {db_name}.{collection_name} → {len(result)}건 수집")
-        except Exception as e:
-            print(f"⚠️ {db_name}.{collection_name} → 수집 실패: {e}")
-            logs[db_name] = []
 
-    return logs
+def encode_log_cursor(source: str, doc: dict) -> str:
+    """
+    페이지 마지막 로그의 위치((event_time, 출처 순번, _id))를 다음 페이지 요청용 불투명 문자열로 만듭니다.
+    """
+    doc_id = doc["_id"]
+    raw = [doc[TIME_FIELD].isoformat(), LOG_SOURCES.index(source),
+           {"$oid": str(doc_id)} if isinstance(doc_id, ObjectId) else doc_id]
+    return base64.urlsafe_b64encode(json.dumps(raw).encode("utf-8")).decode("ascii")
+
 
+def decode_log_cursor(token: str) -> tuple:
+    """encode_log_cursor()의 역변환. 형식이 잘못되면 ValueError를 발생시킵니다."""
+    try:
+        time_str, source_index, doc_id = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        if isinstance(doc_id, dict):
+            doc_id = ObjectId(doc_id["$oid"])
+        return datetime.fromisoformat(time_str), int(source_index), doc_id
+    except Exception:
+        raise ValueError("잘못된 cursor 값입니다.")
+
+
+def _after_cursor(source_index: int, cursor: tuple) -> dict:
+    """
+    병합 순서((event_time, 출처 순번, _id))에서 cursor 다음에 오는 문서만 남기는 조건.
+    """
+    last_time, last_index, last_id = cursor
+    if source_index < last_index:
+        return {TIME_FIELD: {"$gt": last_time}}
+    if source_index > last_index:
+        return {TIME_FIELD: {"$gte": last_time}}
+    return {"$or": [{TIME_FIELD: {"$gt": last_time}}, {TIME_FIELD: last_time, "_id": {"$gt": last_id}}]}
+
+
+def iter_log_page(db_client: MongoClient, query: dict, sources: Iterable[str], limit: int,
+                  cursor: Optional[str] = None, fields: Optional[list] = None) -> Iterator[tuple]:
+    """
+    여러 출처의 로그를 (event_time, 출처 순번, _id) 순서로 병합해 최대 limit건을 한 건씩 내보냅니다.
+    출처마다 (event_time, _id) 인덱스 순서대로 limit건만 읽으므로 기간 크기와 상관없이 한 페이지 분량만 읽습니다.
+
+    :param query: 모든 출처에 공통으로 적용할 조건 (event_time 범위 등)
+    :param cursor: 이전 페이지의 next_cursor (없으면 처음부터)
+    :param fields: 반환할 필드 목록 (없으면 전체). _id와 event_time은 페이지 위치 계산을 위해 항상 포함
+    :return: (출처, 로그 문서) 이터레이터
+    """
+    position = decode_log_cursor(cursor) if cursor else None
+    projection = None
+    if fields:
+        projection = {field: 1 for field in fields}
+        projection[TIME_FIELD] = 1
+
+    def iter_source(source: str):
+        source_index = LOG_SOURCES.index(source)
+        source_query = query if position is None else {"$and": [query, _after_cursor(source_index, position)]}
+        docs = get_log_collection(db_client, source).find(source_query, projection) \
+            .sort([(TIME_FIELD, 1), ("_id", 1)]).limit(limit)
+        for doc in docs:
+            yield doc[TIME_FIELD], source_index, doc["_id"], source, doc
+
+    merged = heapq.merge(*(iter_source(source) for source in sources), key=lambda item: item[:2])
+    for _, _, _, source, doc in islice(merged, limit):
+        yield source, doc
 
 
 '''
@@ -0,0 +1,140 @@
+# app/helpers/geoip_utils.py
+
+import ipaddress
+import os
+import threading
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Optional
+import geoip2.database
+
+GEOIP_CACHE_SIZE = int(os.getenv("GEOIP_CACHE_SIZE", 65536))
+
+_readers: dict[str, Optional[geoip2.database.Reader]] = {}
+_readers_lock = threading.Lock()
+
+
+class GeoInfo(NamedTuple):
+    country: Optional[str] = None
+    asn: Optional[int] = None
+    as_org: Optional[str] = None
+    city: Optional[str] = None
+
+
+_EMPTY = GeoInfo()
+
+
+def _open_reader(env_name: str, required: bool) -> Optional[geoip2.database.Reader]:
+    """
+    1) env_name 환경 변수에서 상대경로(또는 절대경로)를 읽어옵니다.
+    2) 절대경로가 아니라면, 현재 작업 디렉터리(os.getcwd())를 기준으로 절대경로로 변환합니다.
+    3) 프로세스 전체에서 한 번만 메모리 맵(MODE_MMAP) 방식의 Reader를 생성하여 공유합니다.
+    required가 아니고 환경 변수가 없으면 None을 반환합니다.
+    """
+    if env_name in _readers:
+        return _readers[env_name]
+    with _readers_lock:
+        if env_name not in _readers:
+            geoip_path = os.getenv(env_name)
+            if not geoip_path:
+                if required:
+                    raise RuntimeError(f"환경 변수 {env_name}가 설정되지 않았습니다.")
+                _readers[env_name] = None
+            else:
+                # 상대경로 → 절대경로 변환
+                if not os.path.isabs(geoip_path):
+                    geoip_path = os.path.join(os.getcwd(), geoip_path)
+                _readers[env_name] = geoip2.database.Reader(geoip_path, mode=geoip2.database.MODE_MMAP)
+    return _readers[env_name]
+
+
+def get_geoip_reader() -> geoip2.database.Reader:
+    """GEOLITE2_DB_PATH(Country DB)의 공유 Reader를 반환합니다."""
+    return _open_reader("GEOLITE2_DB_PATH", required=True)
+
+
+def _is_public_ip(ip_addr: str) -> bool:
+    """
+    GeoIP 조회가 의미 있는 공인 IP인지 판단합니다.
+    RFC1918 사설망, 링크 로컬(169.254.0.0/16), 루프백, 100.64.0.0/10 등 비공인 대역과
+    "ec2.amazonaws.com", "AWS Internal"처럼 IP가 아닌 값(AWS 내부 호출)은 DB를 조회하지 않습니다.
+    """
+    try:
+        return ipaddress.ip_address(ip_addr).is_global
+    except ValueError:
+        return False
+
+
+@lru_cache(maxsize=GEOIP_CACHE_SIZE)
+def lookup_geo(ip_addr: Optional[str]) -> GeoInfo:
+    """
+    IP 하나의 국가(ISO 코드)와, 해당 DB가 설정된 경우 ASN/도시 정보를 조회합니다.
+    결과는 크기가 제한된 LRU 캐시(GEOIP_CACHE_SIZE, 기본 65536개)에 보관됩니다.
+    ASN은 GEOLITE2_ASN_DB_PATH, 도시는 GEOLITE2_CITY_DB_PATH가 설정되어 있을 때만 조회합니다.
+    """
+    if not ip_addr or not _is_public_ip(ip_addr):
+        return _EMPTY
+
+    country = asn = as_org = city = None
+    try:
+        match = get_geoip_reader().country(ip_addr)
+        country = match.country.iso_code if (match and match.country.iso_code) else None
+    except Exception:
+        country = None
+
+    asn_reader = _open_reader("GEOLITE2_ASN_DB_PATH", required=False)
+    if asn_reader is not None:
+        try:
+            match = asn_reader.asn(ip_addr)
+            asn, as_org = match.autonomous_system_number, match.autonomous_system_organization
+        except Exception:
+            pass
+
+    city_reader = _open_reader("GEOLITE2_CITY_DB_PATH", required=False)
+    if city_reader is not None:
+        try:
+            city = city_reader.city(ip_addr).city.name
+        except Exception:
+            pass
+
+    return GeoInfo(country, asn, as_org, city)
+
+
+def lookup_country(ip_addr: Optional[str]) -> Optional[str]:
+    """
+    주어진 IP의 ISO country code(예: "US", "KR")를 반환하며, 실패 시 None 반환.
+    """
+    return lookup_geo(ip_addr).country
+
+
+def resolve_ips(ip_addrs: Iterable[Optional[str]]) -> dict[str, GeoInfo]:
+    """중복을 제거한 IP 목록을 한 번에 조회하여 {ip: GeoInfo}로 반환합니다."""
+    return {ip: lookup_geo(ip) for ip in set(ip_addrs) if ip}
+
+
+def apply_geo(rec: dict, info: GeoInfo, with_asn: Optional[bool] = None, with_city: Optional[bool] = None) -> None:
+    """
+    레코드에 country 필드를 넣고, ASN/도시 DB가 설정되어 있으면 asn, as_org, city 필드도 넣습니다.
+    """
+    if with_asn is None:
+        with_asn = bool(os.getenv("GEOLITE2_ASN_DB_PATH"))
+    if with_city is None:
+        with_city = bool(os.getenv("GEOLITE2_CITY_DB_PATH"))
+
+    rec["country"] = info.country
+    if with_asn:
+        rec["asn"] = info.asn
+        rec["as_org"] = info.as_org
+    if with_city:
+        rec["city"] = info.city
+
+
+def enrich_batch(records: list, ip_field: str) -> list:
+    """
+    파싱된 레코드 묶음에서 ip_field 값의 고유 IP만 모아 한 번에 조회한 뒤 각 레코드에 반영합니다.
+    """
+    with_asn = bool(os.getenv("GEOLITE2_ASN_DB_PATH"))
+    with_city = bool(os.getenv("GEOLITE2_CITY_DB_PATH"))
+    resolved = resolve_ips(rec.get(ip_field) for rec in records)
+    for rec in records:
+        apply_geo(rec, resolved.get(rec.get(ip_field), _EMPTY), with_asn, with_city)
+    return records
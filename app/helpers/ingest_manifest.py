@@ -0,0 +1,105 @@
+# app/helpers/ingest_manifest.py
+
+import hashlib
+from datetime import datetime, timezone
+from typing import Optional
+from pymongo import MongoClient, UpdateOne
+
+MANIFEST_DB = "aisaws"
+MANIFEST_COLLECTION = "ingest_manifest"
+CHECKPOINT_COLLECTION = "ingest_checkpoints"
+
+
+def make_record_id(key: str, line_no: int) -> str:
+    """
+    S3 객체 키와 줄 번호로 결정적인 문서 _id를 만듭니다.
+    같은 객체를 다시 수집해도 같은 _id가 나오므로 중복 삽입이 거부됩니다.
+    """
+    return f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]}:{line_no}"
+
+
+class IngestManifest:
+    """
+    수집 대상(source)·저장 컬렉션(target)별로 이미 적재한 S3 객체(Key + ETag)와
+    CloudTrail 이벤트의 최종 수집 지점(high-water mark)을 MongoDB에 기록합니다.
+
+    수집기는 객체 하나를 끝까지 yield한 뒤 mark_done()으로 "적재 대기" 상태로 표시하고,
+    실행기는 해당 레코드가 포함된 배치를 DB에 삽입한 뒤 commit()으로 기록을 확정합니다.
+    따라서 중간에 실패해도 확정된 객체만 다음 실행에서 건너뜁니다.
+    """
+
+    def __init__(self, db_client: MongoClient, source: str, target: str):
+        self.source = source
+        self.target = target
+        db = db_client[MANIFEST_DB]
+        self._objects = db[MANIFEST_COLLECTION]
+        self._checkpoints = db[CHECKPOINT_COLLECTION]
+        self._done: Optional[dict[str, str]] = None
+        self._pending_objects: list[dict] = []
+        self._pending_checkpoint: Optional[dict] = None
+
+    def _load(self) -> dict[str, str]:
+        if self._done is None:
+            cursor = self._objects.find(
+                {"source": self.source, "target": self.target},
+                {"_id": 0, "key": 1, "etag": 1}
+            )
+            self._done = {doc["key"]: doc["etag"] for doc in cursor}
+        return self._done
+
+    def is_done(self, key: str, etag: str) -> bool:
+        """이미 같은 ETag로 적재가 확정된 객체인지 확인합니다."""
+        return self._load().get(key) == etag
+
+    def mark_done(self, bucket: str, key: str, etag: str, records: int) -> None:
+        """객체의 모든 레코드를 yield한 뒤 호출합니다. commit() 전까지는 확정되지 않습니다."""
+        self._pending_objects.append({
+            "bucket": bucket, "key": key, "etag": etag, "records": records
+        })
+
+    def get_checkpoint(self, name: str) -> Optional[dict]:
+        """name(예: 리전)에 대해 확정된 high-water mark 문서를 반환합니다."""
+        return self._checkpoints.find_one({"_id": f"{self.source}:{name}:{self.target}"})
+
+    def set_checkpoint(self, name: str, last_event_time: datetime, last_event_ids: list[str],
+                       covered_from: Optional[datetime] = None) -> None:
+        """
+        마지막 이벤트 시각과 그 시각의 이벤트 ID 목록을 적재 대기 상태로 기록합니다.
+        covered_from에는 last_event_time까지 빠짐없이 수집한 구간의 시작 시각을 넣습니다.
+        """
+        self._pending_checkpoint = {
+            "_id": f"{self.source}:{name}:{self.target}",
+            "last_event_time": last_event_time,
+            "last_event_ids": last_event_ids,
+        }
+        if covered_from is not None:
+            self._pending_checkpoint["covered_from"] = covered_from
+
+    def commit(self) -> int:
+        """
+        적재 대기 중인 객체/체크포인트 기록을 확정합니다. 확정한 객체 수를 반환합니다.
+        반드시 해당 레코드들의 DB 삽입이 끝난 뒤에 호출해야 합니다.
+        """
+        now = datetime.now(timezone.utc)
+        pending, self._pending_objects = self._pending_objects, []
+        if pending:
+            self._objects.bulk_write([
+                UpdateOne(
+                    {"source": self.source, "target": self.target, "key": obj["key"]},
+                    {"$set": {**obj, "ingested_at": now}},
+                    upsert=True
+                )
+                for obj in pending
+            ], ordered=False)
+            done = self._load()
+            for obj in pending:
+                done[obj["key"]] = obj["etag"]
+
+        if self._pending_checkpoint:
+            checkpoint, self._pending_checkpoint = self._pending_checkpoint, None
+            self._checkpoints.replace_one(
+                {"_id": checkpoint["_id"]},
+                {**checkpoint, "source": self.source, "target": self.target, "updated_at": now},
+                upsert=True
+            )
+        return len(pending)
@@ -1,33 +1,243 @@
 # app/helpers/llama_index_runner.py
 
-import json
-from typing import Union
-from llama_index.core import VectorStoreIndex, Document
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
+from llama_index.core.indices.vector_store.retrievers import VectorIndexRetriever
+from llama_index.core.prompts.default_prompts import DEFAULT_TEXT_QA_PROMPT
+from llama_index.core.response_synthesizers import get_response_synthesizer
+from llama_index.core.schema import MetadataMode, NodeWithScore, TextNode
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.llms.ollama import Ollama
 from llama_index.core.settings import Settings
+from app.helpers.log_serializer import compact_log_line
 
 # ✅ 전역 설정
 Settings.embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en-v1.5")
 
 #deepseek-coder:6.7b
 #gemma3:4b
+# 분석 호출 한 번의 컨텍스트 길이. 모델 정보의 학습 컨텍스트(gemma3:4b는 128k)를 그대로 쓰면
+# 청크가 너무 커져 CPU 환경에서 request_timeout 안에 끝나지 않으므로 보수적인 기본값을 둡니다.
+# 같은 값을 Ollama에 num_ctx로 넘겨 청크 토큰 예산과 실제 실행 컨텍스트를 맞춥니다.
+OLLAMA_CONTEXT_WINDOW = int(os.getenv("OLLAMA_CONTEXT_WINDOW", "8192"))
 custom_llm = Ollama(
     model="gemma3:4b",
     base_url="http://localhost:11434",
-    request_timeout=600
+    request_timeout=600,
+    context_window=OLLAMA_CONTEXT_WINDOW,
+    additional_kwargs={"num_ctx": OLLAMA_CONTEXT_WINDOW},
 )
 Settings.llm = custom_llm
 
-def run_llama_index_analysis(log_texts: list[Union[str, dict]], prompt: str) -> str:
-    docs = [
-        Document(text=json.dumps(log, ensure_ascii=False, indent=2)) if isinstance(log, dict)
-        else Document(text=log)
-        for log in log_texts
-    ]
+# 로그 임베딩 저장소: VECTOR_STORE_DIR/<출처>/<YYYY-MM-DD>/ 에 날짜별 벡터 인덱스를 저장합니다.
+# 노드 id는 "<출처>:<로그 _id>"이므로 같은 날짜를 다시 분석하면 이미 있는 로그는 임베딩하지 않습니다.
+VECTOR_STORE_DIR = Path(os.getenv("VECTOR_STORE_DIR", "vector_store"))
 
-    index = VectorStoreIndex.from_documents(docs)
-    query_engine = index.as_query_engine(response_mode="compact", llm=custom_llm)
-    response = query_engine.query(prompt)
+# 후속 질문 하나에 검색해 LLM으로 넘길 로그 수
+SIMILARITY_TOP_K = 2
 
-    return str(response).strip()
+# 청크 토큰 예산 계산 시 남겨 둘 여유 비율. 토큰 수는 llama_index 기본 토크나이저(cl100k)로 재므로
+# 실제 모델 토크나이저와의 차이를 흡수합니다.
+TOKEN_BUDGET_RATIO = 0.9
+
+# 메모리에 올려 둘 날짜별 인덱스 수. 넘으면 가장 오래 쓰지 않은 인덱스를 (변경분 저장 후) 내립니다.
+MAX_LOADED_INDEXES = max(1, int(os.getenv("MAX_LOADED_INDEXES", "8")))
+
+# 불러온 날짜별 인덱스 {(출처, 날짜): {"index", "node_ids", "dirty"}} - 최근 사용 순
+_indexes: "OrderedDict[tuple, dict]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def log_node_id(source: str, log: dict) -> str:
+    """로그 문서의 벡터 저장소 노드 id ("<출처>:<_id>")"""
+    return f"{source}:{log['_id']}"
+
+
+def _index_dir(source: str, day: str) -> Path:
+    return VECTOR_STORE_DIR / source / day
+
+
+def _persist_entry(key: tuple, entry: dict) -> None:
+    path = _index_dir(*key)
+    path.mkdir(parents=True, exist_ok=True)
+    entry["index"].storage_context.persist(persist_dir=str(path))
+    entry["dirty"] = False
+
+
+def _get_day_index(source: str, day: str) -> dict:
+    """
+    날짜별 인덱스를 메모리에서 찾고, 없으면 디스크에서 불러오거나 빈 인덱스를 만듭니다. (_lock 안에서 호출)
+    MAX_LOADED_INDEXES를 넘으면 가장 오래 쓰지 않은 인덱스를 저장한 뒤 메모리에서 내립니다.
+    """
+    key = (source, day)
+    entry = _indexes.get(key)
+    if entry is not None:
+        _indexes.move_to_end(key)
+        return entry
+    path = _index_dir(source, day)
+    if (path / "docstore.json").exists():
+        index = load_index_from_storage(StorageContext.from_defaults(persist_dir=str(path)))
+    else:
+        index = VectorStoreIndex(nodes=[])
+    entry = _indexes[key] = {"index": index, "node_ids": set(index.index_struct.nodes_dict), "dirty": False}
+    while len(_indexes) > MAX_LOADED_INDEXES:
+        old_key, old_entry = _indexes.popitem(last=False)
+        if old_entry["dirty"]:
+            _persist_entry(old_key, old_entry)
+    return entry
+
+
+def count_tokens(text: str) -> int:
+    """llama_index 전역 토크나이저로 텍스트의 토큰 수를 셉니다."""
+    return len(Settings.tokenizer(text))
+
+
+def chunk_token_budget(prompt: str) -> int:
+    """
+    분석 LLM 호출 한 번에 로그 줄들이 쓸 수 있는 토큰 수.
+    모델 컨텍스트 길이에서 응답 몫(num_output)과 질의 템플릿 + 프롬프트 토큰을 뺀 값입니다.
+    """
+    metadata = custom_llm.metadata
+    overhead = count_tokens(DEFAULT_TEXT_QA_PROMPT.format(context_str="", query_str=prompt))
+    return max(1, int((metadata.context_window - metadata.num_output - overhead) * TOKEN_BUDGET_RATIO))
+
+
+def _raw_events(logs: Iterable[tuple]) -> Iterator[tuple]:
+    """
+    집계 레코드(log_compression)를 그 첫 원본 이벤트로 바꿉니다. 집계 id는 구간·건수에 따라 달라져
+    저장소에 넣으면 재분석할 때마다 건수만 다른 집계가 쌓이므로, 저장소에는 원본 이벤트만 넣습니다.
+    """
+    for source, log, text in logs:
+        if log.get("aggregate"):
+            sample = log["sample"]
+            yield source, sample, compact_log_line(source, sample)
+        else:
+            yield source, log, text
+
+
+def ensure_embedded(logs: Iterable[tuple]) -> dict:
+    """
+    (출처, 로그, 직렬화 줄) 목록 중 아직 벡터 저장소에 없는 로그만 임베딩해 날짜별 인덱스에 추가합니다.
+    로그는 _id와 event_time(ISO 문자열)을 포함해야 합니다. 집계 레코드는 첫 원본 이벤트로 대신 넣습니다.
+    임베딩 계산은 잠금 밖에서 하므로 여러 분석 워커가 동시에 임베딩할 수 있고, 인덱스 추가만 잠근 채로 합니다.
+
+    :return: {(출처, 날짜): [노드 id, ...]} 로그들이 들어 있는 인덱스별 노드 id
+    """
+    grouped: dict = {}
+    for source, log, text in _raw_events(logs):
+        day = str(log.get("event_time") or "")[:10] or "unknown"
+        grouped.setdefault((source, day), []).append((log_node_id(source, log), text))
+
+    with _lock:
+        missing = {
+            key: [(node_id, text) for node_id, text in items if node_id not in _get_day_index(*key)["node_ids"]]
+            for key, items in grouped.items()
+        }
+
+    new_nodes = {
+        (source, day): [
+            TextNode(
+                id_=node_id,
+                text=text,
+                metadata={"source": source, "date": day},
+                # 출처·시각은 직렬화 줄에 이미 들어 있음
+                excluded_embed_metadata_keys=["source", "date"],
+                excluded_llm_metadata_keys=["source", "date"],
+            )
+            for node_id, text in items
+        ]
+        for (source, day), items in missing.items() if items
+    }
+    all_nodes = [node for nodes in new_nodes.values() for node in nodes]
+    if all_nodes:
+        embeddings = Settings.embed_model.get_text_embedding_batch(
+            [node.get_content(metadata_mode=MetadataMode.EMBED) for node in all_nodes]
+        )
+        for node, embedding in zip(all_nodes, embeddings):
+            node.embedding = embedding
+
+    with _lock:
+        for key, nodes in new_nodes.items():
+            entry = _get_day_index(*key)
+            # 임베딩하는 사이 다른 워커가 같은 로그를 추가했을 수 있음
+            nodes = [node for node in nodes if node.id_ not in entry["node_ids"]]
+            if nodes:
+                entry["index"].insert_nodes(nodes)  # 임베딩이 이미 있으므로 다시 계산하지 않음
+                entry["node_ids"].update(node.id_ for node in nodes)
+                entry["dirty"] = True
+    return {key: [node_id for node_id, _ in items] for key, items in grouped.items()}
+
+
+def persist_indexes() -> int:
+    """새 로그가 추가된 날짜별 인덱스를 디스크에 저장하고, 저장한 인덱스 수를 반환합니다."""
+    saved = 0
+    with _lock:
+        for key, entry in _indexes.items():
+            if not entry["dirty"]:
+                continue
+            _persist_entry(key, entry)
+            saved += 1
+    return saved
+
+
+def _retrieve(prompt: str, located: dict, top_k: int) -> list[NodeWithScore]:
+    """인덱스별로 지정된 노드(None이면 전체) 안에서만 검색한 뒤 점수순으로 top_k개를 고릅니다."""
+    results = []
+    for key, node_ids in located.items():
+        # 다른 분석 작업이 같은 인덱스에 노드를 추가하는 중에 검색하지 않도록 잠근 채로 검색
+        with _lock:
+            index = _get_day_index(*key)["index"]
+            if node_ids is None:
+                node_ids = list(index.index_struct.nodes_dict.values())
+            retriever = VectorIndexRetriever(index, similarity_top_k=top_k, node_ids=node_ids)
+            results.extend(retriever.retrieve(prompt))
+    results.sort(key=lambda node: node.score or 0.0, reverse=True)
+    return results[:top_k]
+
+
+def _synthesize(prompt: str, nodes: list[NodeWithScore], llm) -> str:
+    synthesizer = get_response_synthesizer(response_mode="compact", llm=llm)
+    return str(synthesizer.synthesize(prompt, nodes=nodes)).strip()
+
+
+def run_llama_index_analysis(logs: list[tuple], prompt: str) -> str:
+    """
+    (출처, 로그, 직렬화 줄) 묶음을 분석합니다. 묶음은 chunk_token_budget() 안에 들어가도록 채워져 있으므로
+    검색으로 일부를 고르지 않고 모든 줄을 한 번의 LLM 호출에 넣습니다.
+    로그는 후속 질문(/ask)용 벡터 저장소에 한 번만 임베딩됩니다.
+    """
+    ensure_embedded(logs)
+    nodes = [NodeWithScore(node=TextNode(text=text)) for _, _, text in logs]
+    return _synthesize(prompt, nodes, custom_llm)
+
+
+def ask_stored_logs(question: str, sources: Iterable[str], days: Iterable[str],
+                    model: Optional[str] = None, top_k: int = SIMILARITY_TOP_K,
+                    context: Optional[str] = None) -> str:
+    """
+    저장된 날짜별 인덱스(분석 때 임베딩된 로그)를 대상으로 후속 질문에 답합니다.
+    임베딩되지 않은 날짜는 검색 대상에서 빠지고, 검색된 로그가 없으면 요약 문맥과 질문만으로 LLM에 직접 묻습니다.
+
+    :param model: Ollama 모델 이름 (없으면 기본 LLM)
+    :param context: 질문 앞에 붙일 추가 문맥 (예: 분석 요약)
+    """
+    located = {}
+    with _lock:
+        for source in sources:
+            for day in days:
+                if (source, day) in _indexes or (_index_dir(source, day) / "docstore.json").exists():
+                    located[(source, day)] = None
+    nodes = _retrieve(question, located, top_k) if located else []
+    query = f"[요약 정보]\n{context}\n\n[사용자 질문]\n{question}" if context else question
+    llm = custom_llm if not model else Ollama(
+        model=model, base_url=custom_llm.base_url, request_timeout=600,
+        context_window=OLLAMA_CONTEXT_WINDOW, additional_kwargs={"num_ctx": OLLAMA_CONTEXT_WINDOW},
+    )
+    if not nodes:
+        # 노드 없이 synthesize()를 부르면 LLM을 호출하지 않고 "Empty Response"를 돌려줌
+        return str(llm.complete(query)).strip()
+    return _synthesize(query, nodes, llm)
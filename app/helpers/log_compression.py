@@ -0,0 +1,171 @@
+# app/helpers/log_compression.py
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+# LLM 분석 전 반복 이벤트 접기.
+# 시간순 (출처, 로그) 스트림을 COMPRESS_WINDOW_MINUTES 단위 구간으로 나눠, 구간 안에서 출처별 키가 같은
+# 반복 이벤트를 건수·처음/마지막 시각·바이트 합계가 든 집계 레코드 하나로 바꿉니다.
+# 구간 안에서 한 번만 나온 이벤트와 실패·쓰기 이벤트는 원본 그대로 둡니다. 0이면 접지 않습니다.
+COMPRESS_WINDOW_MINUTES = int(os.getenv("COMPRESS_WINDOW_MINUTES", "60"))
+
+# 한 구간에서 버퍼에 둘 최대 항목 수. 넘으면 구간이 끝나기 전이라도 내보냅니다. (메모리 상한)
+MAX_WINDOW_ENTRIES = 50000
+
+# 출처별 접기 키 필드
+# VPC 흐름은 출발지 포트를 키에서 뺀 (출발지, 목적지, 목적지 포트, 프로토콜, ACCEPT/REJECT)로 접습니다.
+# 출발지 포트는 연결마다 바뀌는 임시 포트라 키에 넣으면 거의 접히지 않기 때문이며,
+# 대신 집계 레코드에 고유 출발지 포트 수(srcport_count)를 남겨 연결 수·포트 분포를 볼 수 있게 합니다.
+FOLD_KEYS = {
+    "cloudtrail": ("EventName", "EventSource", "principalArn", "Username", "sourceIPAddress"),
+    "vpcflow": ("srcaddr", "dstaddr", "dstport", "protocol", "action"),
+    "s3accesslog": ("operation", "bucket", "key", "remote_ip", "requester", "http_status"),
+}
+
+# 출처별로 키에서 빼고 고유값 수만 세는 필드 {출처: (원본 필드, 집계 레코드 필드)}
+DISTINCT_FIELDS = {
+    "vpcflow": ("srcport", "srcport_count"),
+}
+
+# 출처별 합산할 바이트 필드
+BYTES_FIELDS = {
+    "vpcflow": "bytes",
+    "s3accesslog": "bytes_sent",
+}
+
+_READ_PREFIXES = ("Describe", "List", "Get", "Head", "Lookup")
+
+# 접는 S3 요청 종류 (operation "REST.GET.OBJECT"의 가운데 부분). PUT/POST/DELETE 등 쓰기는 원본 유지
+_S3_READ_VERBS = frozenset({"GET", "HEAD"})
+
+
+def is_foldable(source: str, log: dict) -> bool:
+    """
+    접어도 되는 이벤트인지 판단합니다.
+    CloudTrail은 오류 없는 읽기 전용 호출만, S3는 4xx/5xx가 아닌 읽기(GET/HEAD) 요청만 접습니다.
+    VPC 흐름은 ACCEPT/REJECT가 키에 들어가므로 모두 접습니다.
+    """
+    if source == "cloudtrail":
+        if log.get("errorCode"):
+            return False
+        read_only = log.get("readOnly")
+        if read_only is None:
+            return str(log.get("EventName") or "").startswith(_READ_PREFIXES)
+        return bool(read_only)
+    if source == "s3accesslog":
+        parts = str(log.get("operation") or "").split(".")
+        if len(parts) < 2 or parts[1] not in _S3_READ_VERBS:
+            return False
+        status = log.get("http_status")
+        return not (status and status.isdigit() and int(status) >= 400)
+    return source in FOLD_KEYS
+
+
+def _window_of(log: dict, window_seconds: int) -> Optional[int]:
+    value = log.get("event_time")
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+    return int(ts // window_seconds)
+
+
+def _aggregate_record(source: str, key: tuple, group: dict) -> dict:
+    first = group["first"]
+    record = {name: value for name, value in zip(FOLD_KEYS[source], key) if value is not None}
+    record.update({
+        "aggregate": True,
+        "count": group["count"],
+        "event_time": first.get("event_time"),
+        "first_seen": first.get("event_time"),
+        "last_seen": group["last_seen"],
+    })
+    if source in BYTES_FIELDS:
+        record[BYTES_FIELDS[source]] = group["bytes"]
+    if source in DISTINCT_FIELDS:
+        record[DISTINCT_FIELDS[source][1]] = len(group["distinct"])
+    if first.get("country"):
+        record["country"] = first["country"]
+    # 집계의 첫 원본 이벤트. 벡터 저장소에는 집계 대신 이 원본을 넣음 (집계 id는 건수에 따라 바뀌므로)
+    record["sample"] = first
+    # 같은 구간·키·건수면 같은 id → 재실행 시 청크 요약 캐시 키가 유지됨
+    digest = hashlib.sha1(
+        json.dumps([source, key, group["count"], record["first_seen"], record["last_seen"]], default=str).encode("utf-8")
+    ).hexdigest()[:24]
+    record["_id"] = f"agg:{digest}"
+    return record
+
+
+def compress_events(events: Iterable[tuple], stats: Optional[dict] = None,
+                    window_minutes: int = COMPRESS_WINDOW_MINUTES) -> Iterator[tuple]:
+    """
+    시간순 (출처, 로그) 스트림의 반복 이벤트를 구간별 집계 레코드로 접어 (출처, 로그 또는 집계) 스트림으로 내보냅니다.
+    출력 순서는 구간 단위로 시간순이며, 구간 안에서는 각 키가 처음 나온 순서를 따릅니다.
+
+    :param stats: 주어지면 {"in": 입력 건수, "out": 출력 항목 수, "folded": 집계 레코드 수}를 채움
+    :param window_minutes: 접기 구간 길이(분). 0 이하이면 입력을 그대로 내보냄
+    """
+    stats = stats if stats is not None else {}
+    stats.update({"in": 0, "out": 0, "folded": 0})
+    if window_minutes <= 0:
+        for item in events:
+            stats["in"] += 1
+            stats["out"] += 1
+            yield item
+        return
+
+    window_seconds = window_minutes * 60
+    current_window = None
+    entries: list = []  # [(출처, 원본 로그)] 또는 [(출처, 키, 그룹)] - 처음 나온 순서
+    groups: dict = {}
+
+    def flush():
+        for entry in entries:
+            if len(entry) == 2:
+                yield entry
+                continue
+            source, key, group = entry
+            if group["count"] == 1:
+                yield source, group["first"]
+            else:
+                stats["folded"] += 1
+                yield source, _aggregate_record(source, key, group)
+        entries.clear()
+        groups.clear()
+
+    for source, log in events:
+        stats["in"] += 1
+        window = _window_of(log, window_seconds)
+        if window != current_window or len(entries) >= MAX_WINDOW_ENTRIES:
+            for item in flush():
+                stats["out"] += 1
+                yield item
+            current_window = window
+
+        if window is None or not is_foldable(source, log):
+            entries.append((source, log))
+            continue
+
+        key = (source,) + tuple(log.get(field) for field in FOLD_KEYS[source])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {"first": log, "count": 0, "last_seen": None, "bytes": 0, "distinct": set()}
+            entries.append((source, key[1:], group))
+        group["count"] += 1
+        group["last_seen"] = log.get("event_time")
+        size = log.get(BYTES_FIELDS.get(source, ""))
+        if isinstance(size, int):
+            group["bytes"] += size
+        if source in DISTINCT_FIELDS:
+            value = log.get(DISTINCT_FIELDS[source][0])
+            if value is not None:
+                group["distinct"].add(value)
+
+    for item in flush():
+        stats["out"] += 1
+        yield item
@@ -0,0 +1,103 @@
+# app/helpers/log_envelope.py
+
+from datetime import datetime
+from typing import Optional
+
+# 모든 로그 문서에 수집 시 한 번 계산해 넣는 정규화 필드(env).
+# 출처마다 시각·주체·IP 필드 이름과 형식이 달라 교차 정렬·필터·상관 분석이 어려우므로,
+# 같은 이름과 형식의 작은 하위 문서로 맞춰 둡니다.
+#   ts       : 이벤트 시각 (epoch 밀리초, int)
+#   source   : 출처 (cloudtrail, vpcflow, s3accesslog)
+#   actor    : 요청 주체 (IAM ARN/사용자 이름, S3 requester). VPC 흐름은 주체가 없어 None
+#   src_ip   : 요청 출발지 IP
+#   action   : 수행한 동작 ("iam:CreateUser", "REST.GET.OBJECT", "tcp")
+#   resource : 대상 (리소스 ARN, "버킷/키", "목적지IP:포트")
+#   outcome  : "success" | "failure" | None(판단 불가)
+ENVELOPE_FIELD = "env"
+
+_EPOCH = datetime(1970, 1, 1)
+
+# VPC Flow Log protocol 번호 → 이름 (IANA)
+_PROTOCOLS = {"1": "icmp", "6": "tcp", "17": "udp", "58": "icmpv6"}
+
+# VPC Flow Log action → outcome
+_FLOW_OUTCOMES = {"ACCEPT": "success", "REJECT": "failure"}
+
+
+def to_epoch_ms(event_time: Optional[datetime]) -> Optional[int]:
+    """UTC 기준 naive datetime(event_time)을 epoch 밀리초로 바꿉니다."""
+    if event_time is None:
+        return None
+    delta = event_time - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+
+def _envelope(source, ts, actor, src_ip, action, resource, outcome) -> dict:
+    return {
+        "ts": ts,
+        "source": source,
+        "actor": actor,
+        "src_ip": src_ip,
+        "action": action,
+        "resource": resource,
+        "outcome": outcome,
+    }
+
+
+def cloudtrail_envelope(event: dict) -> dict:
+    """
+    CloudTrail 이벤트의 정규화 필드를 만듭니다.
+
+    :param event: enrich_cloudtrail_events()가 구조화 필드(principalArn, sourceIPAddress, errorCode 등)와
+                  event_time을 채운 이벤트
+    """
+    event_source = event.get("EventSource") or ""
+    event_name = event.get("EventName")
+    service = event_source.split(".", 1)[0]
+    resources = event.get("Resources") or []
+    parsed = isinstance(event.get("CloudTrailEvent"), dict)
+    return _envelope(
+        "cloudtrail",
+        to_epoch_ms(event.get("event_time")),
+        event.get("principalArn") or event.get("Username"),
+        event.get("sourceIPAddress"),
+        f"{service}:{event_name}" if service and event_name else event_name,
+        resources[0].get("ResourceName") if resources else None,
+        ("failure" if event.get("errorCode") else "success") if parsed else None,
+    )
+
+
+def s3_access_envelope(rec: dict) -> dict:
+    """S3 서버 액세스 로그 레코드(parse_s3_log_line 결과)의 정규화 필드를 만듭니다."""
+    status = rec.get("http_status")
+    outcome = None
+    if status and status.isdigit():
+        outcome = "success" if int(status) < 400 else "failure"
+    bucket = rec.get("bucket")
+    key = rec.get("key")
+    return _envelope(
+        "s3accesslog",
+        to_epoch_ms(rec.get("event_time")),
+        rec.get("requester"),
+        rec.get("remote_ip"),
+        rec.get("operation"),
+        f"{bucket}/{key}" if key else bucket,
+        outcome,
+    )
+
+
+def vpc_flow_envelope(rec: dict) -> dict:
+    """VPC Flow Log 레코드(event_time 포함)의 정규화 필드를 만듭니다."""
+    protocol = rec.get("protocol")
+    dstaddr = rec.get("dstaddr")
+    dstport = rec.get("dstport")
+    flow_action = rec.get("action")
+    return _envelope(
+        "vpcflow",
+        to_epoch_ms(rec.get("event_time")),
+        None,
+        rec.get("srcaddr"),
+        _PROTOCOLS.get(protocol, protocol),
+        f"{dstaddr}:{dstport}" if dstaddr and dstport is not None else dstaddr,
+        _FLOW_OUTCOMES.get(flow_action),
+    )
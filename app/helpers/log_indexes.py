@@ -0,0 +1,128 @@
+# app/helpers/log_indexes.py
+
+from pymongo import ASCENDING, IndexModel, MongoClient
+from pymongo.errors import PyMongoError, ServerSelectionTimeoutError
+from app.helpers.log_envelope import ENVELOPE_FIELD
+from app.helpers.log_rollups import get_rollup_collection
+from app.helpers.log_store import LOG_SOURCES, TIME_FIELD, get_log_collection
+
+# 앱 시작 시 MongoDB를 찾는 최대 대기 시간(ms). 기본 30초를 그대로 기다리지 않도록 짧게 둡니다.
+SERVER_SELECTION_TIMEOUT_MS = 5000
+
+# 출처별 로그 컬렉션 인덱스 정의 {이름: 키 목록}
+# 모든 조회(분석용 병합 스트림 iter_merged_logs, 리포트 로그 조회)가 event_time 범위 조건 + event_time 정렬이므로 event_time 인덱스를 둡니다.
+# /get-log 페이지 조회는 (event_time, _id) 순서로 이어 읽으므로 _id를 두 번째 키로 포함합니다.
+# 대시보드 차트는 원본 대신 시간 단위 집계(rollups_hourly)를 읽으므로 차트용 복합 인덱스는 두지 않습니다.
+# 정규화 필드(env)는 IP·주체로 출처를 가로질러 이벤트를 찾는 상관 조회용으로 (값, env.ts) 인덱스를 둡니다.
+# VPC 흐름에는 주체(actor)가 없으므로 actor 인덱스를 두지 않습니다.
+# CloudTrail은 유출 키 추적(AccessKeyId)과 거부·실패 호출 조회(errorCode)용 인덱스를 추가로 둡니다.
+_EVENT_TIME_ID = [(TIME_FIELD, ASCENDING), ("_id", ASCENDING)]
+_ENV_SRC_IP_TS = [(f"{ENVELOPE_FIELD}.src_ip", ASCENDING), (f"{ENVELOPE_FIELD}.ts", ASCENDING)]
+_ENV_ACTOR_TS = [(f"{ENVELOPE_FIELD}.actor", ASCENDING), (f"{ENVELOPE_FIELD}.ts", ASCENDING)]
+
+LOG_INDEXES = {
+    "cloudtrail": {
+        "ix_event_time_id": _EVENT_TIME_ID,
+        "ix_env_src_ip_ts": _ENV_SRC_IP_TS,
+        "ix_env_actor_ts": _ENV_ACTOR_TS,
+        "ix_access_key_time": [("AccessKeyId", ASCENDING), (TIME_FIELD, ASCENDING)],
+        "ix_error_code_time": [("errorCode", ASCENDING), (TIME_FIELD, ASCENDING)],
+    },
+    "vpcflow": {
+        "ix_event_time_id": _EVENT_TIME_ID,
+        "ix_env_src_ip_ts": _ENV_SRC_IP_TS,
+    },
+    "s3accesslog": {
+        "ix_event_time_id": _EVENT_TIME_ID,
+        "ix_env_src_ip_ts": _ENV_SRC_IP_TS,
+        "ix_env_actor_ts": _ENV_ACTOR_TS,
+    },
+}
+
+# 시간 단위 집계 컬렉션 인덱스 (모든 출처 공통): 차트는 차원 하나의 시각 범위를 읽음
+ROLLUP_INDEXES = {
+    "ix_dim_hour": [("dim", ASCENDING), ("hour", ASCENDING)],
+}
+
+# 이전 버전이 만들었지만 더 이상 정의에 없는 인덱스. 시작 시 정리합니다.
+RETIRED_INDEXES = {"event_time_1"}
+
+# 이 모듈이 관리하는 인덱스 이름 접두사 (정의에서 빠진 인덱스를 찾아 지울 때 사용)
+MANAGED_PREFIX = "ix_"
+
+
+def ensure_log_indexes(db_client: MongoClient, source: str) -> None:
+    """
+    출처 로그 컬렉션에 정의된 인덱스를 만듭니다. 이미 같은 정의로 있으면 아무 일도 하지 않으므로
+    수집을 시작할 때마다 호출해도 됩니다.
+    """
+    models = [IndexModel(keys, name=name) for name, keys in LOG_INDEXES[source].items()]
+    get_log_collection(db_client, source).create_indexes(models)
+    models = [IndexModel(keys, name=name) for name, keys in ROLLUP_INDEXES.items()]
+    get_rollup_collection(db_client, source).create_indexes(models)
+
+
+def sync_log_indexes(db_client: MongoClient, source: str) -> dict:
+    """
+    출처 로그 컬렉션과 집계 컬렉션의 실제 인덱스를 정의와 비교해 맞춥니다.
+
+    :return: {"created": [...], "rebuilt": [...], "dropped": [...]}
+    """
+    result = _sync_indexes(get_log_collection(db_client, source), LOG_INDEXES[source])
+    rollup_result = _sync_indexes(get_rollup_collection(db_client, source), ROLLUP_INDEXES)
+    for kind, names in rollup_result.items():
+        result[kind].extend(f"rollups.{name}" for name in names)
+    return result
+
+
+def _sync_indexes(coll, wanted: dict) -> dict:
+    """
+    컬렉션의 실제 인덱스를 wanted 정의와 맞춥니다.
+    1) 정의에 없는 관리 대상 인덱스(ix_ 접두사, RETIRED_INDEXES)는 삭제
+    2) 이름은 같지만 키 구성이 달라진 인덱스는 삭제 후 다시 생성
+    3) 없는 인덱스는 생성
+    """
+    existing = coll.index_information()
+    result = {"created": [], "rebuilt": [], "dropped": []}
+
+    for name in list(existing):
+        if name == "_id_" or name in wanted:
+            continue
+        if name in RETIRED_INDEXES or name.startswith(MANAGED_PREFIX):
+            coll.drop_index(name)
+            result["dropped"].append(name)
+
+    for name, keys in wanted.items():
+        if name in existing:
+            if [tuple(k) for k in existing[name]["key"]] == [tuple(k) for k in keys]:
+                continue
+            coll.drop_index(name)
+            result["rebuilt"].append(name)
+        else:
+            result["created"].append(name)
+        coll.create_index(keys, name=name)
+
+    return result
+
+
+def sync_all_log_indexes(mongodb_uri: str) -> None:
+    """
+    앱 시작 시 모든 출처의 로그 인덱스를 확인·갱신하고 결과를 출력합니다.
+    MongoDB에 연결할 수 없어도 앱은 계속 뜨도록 오류는 출력만 하며, 서버를 찾지 못하면
+    출처마다 서버 선택 시간 제한을 다시 기다리지 않고 바로 멈춥니다.
+    """
+    client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS)
+    try:
+        for source in LOG_SOURCES:
+            try:
+                result = sync_log_indexes(client, source)
+            except ServerSelectionTimeoutError as e:
+                print(f"⚠️ 로그 인덱스 확인 건너뜀: MongoDB 연결 실패 ({e})")
+                return
+            except PyMongoError as e:
+                print(f"⚠️ {source} 인덱스 확인 실패: {e}")
+                continue
+            changes = ", ".join(f"{kind} {names}" for kind, names in result.items() if names)
+            print(f"✅ {source} 인덱스 확인 완료" + (f" ({changes})" if changes else ""))
+    finally:
+        client.close()
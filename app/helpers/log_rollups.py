@@ -0,0 +1,177 @@
+# app/helpers/log_rollups.py
+
+from collections import Counter, defaultdict
+from datetime import datetime
+from pymongo import MongoClient, ReplaceOne, UpdateOne
+from app.helpers.log_store import TIME_FIELD, get_log_collection
+
+# 출처 DB마다 두는 시간 단위 집계 컬렉션.
+# 문서 하나 = (시각(정시), 차원, 값)의 건수이며, 대시보드는 원본 로그 대신 이 문서들을 합산합니다.
+ROLLUP_COLLECTION = "rollups_hourly"
+
+# 원본 로그로 집계를 다시 만들 때 한 번에 쓰는 집계 문서 수
+BACKFILL_BATCH_SIZE = 1000
+
+# 출처별 건수 집계 차원 {차원 이름: 레코드 필드}
+COUNT_DIMENSIONS = {
+    "cloudtrail": {"EventName": "EventName"},
+    "vpcflow": {"action": "action", "srcaddr": "srcaddr"},
+    "s3accesslog": {"http_status": "http_status", "key": "key", "country": "country"},
+}
+
+# 출처별 집합 집계 차원 {차원 이름: (그룹 필드, 모을 필드)}
+# 예) srcaddr_dstports: 시간별로 출발지 IP마다 접속한 목적지 포트 집합 (포트 스캔 탐지용)
+SET_DIMENSIONS = {
+    "vpcflow": {"srcaddr_dstports": ("srcaddr", "dstport")},
+}
+
+
+def get_rollup_collection(db_client, source: str):
+    """출처의 시간 단위 집계 컬렉션을 반환합니다. (MongoClient, AsyncIOMotorClient 모두 사용 가능)"""
+    return db_client[source][ROLLUP_COLLECTION]
+
+
+def _hour_of(doc: dict):
+    event_time = doc.get(TIME_FIELD)
+    if not isinstance(event_time, datetime):
+        return None
+    return event_time.replace(minute=0, second=0, microsecond=0)
+
+
+def update_rollups(db_client: MongoClient, source: str, documents: list) -> int:
+    """
+    새로 삽입된 문서들로 시간 단위 집계를 갱신합니다. 같은 문서를 두 번 넘기면 두 번 집계되므로,
+    insert_documents()의 on_inserted 콜백으로 중복이 아닌 문서만 넘겨야 합니다.
+    배치 안에서 먼저 합산한 뒤 (시각, 차원, 값)마다 한 번씩만 $inc / $addToSet 합니다.
+
+    :return: 갱신한 집계 문서 수
+    """
+    counts: Counter = Counter()
+    sets: dict = defaultdict(set)
+    count_dims = COUNT_DIMENSIONS.get(source, {}).items()
+    set_dims = SET_DIMENSIONS.get(source, {}).items()
+
+    for doc in documents:
+        hour = _hour_of(doc)
+        if hour is None:
+            continue
+        for dim, field in count_dims:
+            counts[(hour, dim, doc.get(field))] += 1
+        for dim, (group_field, member_field) in set_dims:
+            member = doc.get(member_field)
+            if member is not None:
+                sets[(hour, dim, doc.get(group_field))].add(member)
+
+    ops = [
+        UpdateOne(
+            {"_id": {"hour": hour, "dim": dim, "value": value}},
+            {"$inc": {"count": count}, "$setOnInsert": {"hour": hour, "dim": dim, "value": value}},
+            upsert=True
+        )
+        for (hour, dim, value), count in counts.items()
+    ]
+    ops.extend(
+        UpdateOne(
+            {"_id": {"hour": hour, "dim": dim, "value": value}},
+            {"$addToSet": {"members": {"$each": sorted(members)}},
+             "$setOnInsert": {"hour": hour, "dim": dim, "value": value}},
+            upsert=True
+        )
+        for (hour, dim, value), members in sets.items()
+    )
+    if ops:
+        get_rollup_collection(db_client, source).bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+_DATE_PARTS = ("year", "month", "day", "hour", "minute")
+_DATE_PART_OPERATORS = {"year": "$year", "month": "$month", "day": "$dayOfMonth", "hour": "$hour", "minute": "$minute"}
+
+
+def truncate_date(date_expr: str, unit: str) -> dict:
+    """
+    날짜 식을 unit(minute/hour/day) 단위로 내린 집계 식을 만듭니다.
+    $dateTrunc(MongoDB 5.0+) 대신 $dateFromParts를 써서 이전 버전 서버에서도 동작합니다.
+    """
+    parts = _DATE_PARTS[:_DATE_PARTS.index(unit) + 1]
+    return {"$dateFromParts": {part: {_DATE_PART_OPERATORS[part]: date_expr} for part in parts}}
+
+
+def _replace_rollups(rollups, dim: str, time_filter: dict, rows) -> int:
+    """기간의 dim 집계 문서를 지우고 rows({"hour", "value", 필드...})로 다시 씁니다."""
+    rollups.delete_many({"dim": dim, "hour": time_filter[TIME_FIELD]})
+    written = 0
+    ops = []
+    for row in rows:
+        key = {"hour": row.pop("hour"), "dim": dim, "value": row.pop("value", None)}
+        ops.append(ReplaceOne({"_id": key}, {**key, **row}, upsert=True))
+        if len(ops) >= BACKFILL_BATCH_SIZE:
+            written += len(ops)
+            rollups.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        written += len(ops)
+        rollups.bulk_write(ops, ordered=False)
+    return written
+
+
+def backfill_rollups(db_client: MongoClient, source: str, time_filter: dict) -> int:
+    """
+    기간 안의 원본 로그로 시간 단위 집계를 다시 만듭니다. 집계가 도입되기 전에 수집된 기간용이며,
+    그 기간의 기존 집계 문서는 지우고 원본에서 계산한 값으로 바꾸므로 여러 번 실행해도 결과가 같습니다.
+    계산은 서버의 집계 파이프라인에서 하며, 같은 기간에 수집기가 쓰는 중이면 그 사이 삽입분은 빠질 수 있습니다.
+
+    :param time_filter: 원본 로그용 event_time 범위 조건 (time_range_filter() 결과). 날짜 단위여야 함
+    :return: 쓴 집계 문서 수
+    """
+    logs = get_log_collection(db_client, source)
+    rollups = get_rollup_collection(db_client, source)
+    match = {"$match": {TIME_FIELD: {**time_filter[TIME_FIELD], "$type": "date"}}}
+    hour = truncate_date("$" + TIME_FIELD, "hour")
+    written = 0
+
+    for dim, field in COUNT_DIMENSIONS.get(source, {}).items():
+        rows = logs.aggregate([
+            match,
+            {"$group": {"_id": {"hour": hour, "value": "$" + field}, "count": {"$sum": 1}}},
+            {"$project": {"_id": 0, "hour": "$_id.hour", "value": "$_id.value", "count": 1}},
+        ], allowDiskUse=True)
+        written += _replace_rollups(rollups, dim, time_filter, rows)
+
+    for dim, (group_field, member_field) in SET_DIMENSIONS.get(source, {}).items():
+        rows = logs.aggregate([
+            match,
+            {"$match": {member_field: {"$ne": None}}},
+            {"$group": {"_id": {"hour": hour, "value": "$" + group_field},
+                        "members": {"$addToSet": "$" + member_field}}},
+            {"$project": {"_id": 0, "hour": "$_id.hour", "value": "$_id.value", "members": 1}},
+        ], allowDiskUse=True)
+        written += _replace_rollups(rollups, dim, time_filter, rows)
+
+    return written
+
+
+def rollup_match(dim: str, time_filter: dict) -> dict:
+    """
+    원본 로그용 event_time 범위 조건을 집계 문서용 $match 단계로 바꿉니다.
+    조회 구간은 날짜 단위이므로 정시 경계와 일치합니다.
+    """
+    return {"$match": {"dim": dim, "hour": time_filter[TIME_FIELD]}}
+
+
+def count_pipeline(dim: str, time_filter: dict) -> list:
+    """기간 안의 차원 값별 건수를 합산하는 파이프라인 ({_id: 값, count: 건수})"""
+    return [
+        rollup_match(dim, time_filter),
+        {"$group": {"_id": "$value", "count": {"$sum": "$count"}}},
+    ]
+
+
+def set_size_pipeline(dim: str, time_filter: dict) -> list:
+    """기간 안의 그룹 값별 고유 멤버 수를 구하는 파이프라인 ({_id: 그룹 값, num_members: 고유 멤버 수})"""
+    return [
+        rollup_match(dim, time_filter),
+        {"$unwind": "$members"},
+        {"$group": {"_id": "$value", "members": {"$addToSet": "$members"}}},
+        {"$project": {"num_members": {"$size": "$members"}}},
+    ]
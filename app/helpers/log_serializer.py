@@ -0,0 +1,106 @@
+# app/helpers/log_serializer.py
+
+import json
+
+# LLM에 넘기는 로그 한 줄 직렬화.
+# 들여쓰기·null·기본값·수집용 내부 필드(_id, env, event_time 외 시각 중복 등)를 빼고
+# 출처별로 정해진 순서의 "이름=값" 한 줄로 만들어 같은 컨텍스트에 더 많은 이벤트가 들어가게 합니다.
+
+# CloudTrail 요청 파라미터는 원문이 길 수 있어 이 길이까지만 넣습니다.
+MAX_PARAMS_CHARS = 300
+
+# 줄에 넣지 않는 값 (값 없음 표기)
+_EMPTY = (None, "", "-", [], {})
+
+
+def _time(log: dict) -> str:
+    # event_time은 convert_for_json()을 거친 ISO 문자열 ("2025-05-23T01:02:03")
+    value = str(log.get("event_time") or "")
+    return value[:19] + "Z" if value else "-"
+
+
+def _pairs(log: dict, fields: tuple) -> str:
+    return " ".join(
+        f"{name}={log[field]}" for name, field in fields if log.get(field) not in _EMPTY
+    )
+
+
+def _compact_json(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _cloudtrail_line(log: dict) -> str:
+    event = log.get("CloudTrailEvent")
+    event = event if isinstance(event, dict) else {}
+    service = (log.get("EventSource") or "").split(".", 1)[0]
+    action = f"{service}:{log.get('EventName')}" if service else str(log.get("EventName"))
+    parts = [
+        "ct", _time(log), action,
+        _pairs(log, (
+            ("actor", "principalArn"), ("user", "Username"), ("key", "AccessKeyId"),
+            ("ip", "sourceIPAddress"), ("country", "country"), ("ua", "userAgent"),
+            ("err", "errorCode"),
+        )),
+    ]
+    if log.get("readOnly") is False:
+        parts.append("write")
+    resources = [res.get("ResourceName") for res in log.get("Resources") or [] if res.get("ResourceName")]
+    if resources:
+        parts.append("res=" + ",".join(resources))
+    params = event.get("requestParameters")
+    if params not in _EMPTY:
+        parts.append("params=" + _compact_json(params)[:MAX_PARAMS_CHARS])
+    return " ".join(part for part in parts if part)
+
+
+def _vpcflow_line(log: dict) -> str:
+    src = f"{log.get('srcaddr')}:{log.get('srcport')}" if log.get("srcport") is not None else str(log.get("srcaddr"))
+    dst = f"{log.get('dstaddr')}:{log.get('dstport')}" if log.get("dstport") is not None else str(log.get("dstaddr"))
+    parts = [
+        "vpc", _time(log), f"{src}->{dst}", str(log.get("action") or "-"),
+        _pairs(log, (
+            ("proto", "protocol"), ("pkts", "packets"), ("bytes", "bytes"), ("srcports", "srcport_count"),
+            ("eni", "interface_id"), ("country", "country"),
+        )),
+    ]
+    return " ".join(part for part in parts if part)
+
+
+def _s3_line(log: dict) -> str:
+    target = f"{log.get('bucket')}/{log['key']}" if log.get("key") else str(log.get("bucket"))
+    parts = [
+        "s3", _time(log), str(log.get("operation") or "-"), target, str(log.get("http_status") or "-"),
+        _pairs(log, (
+            ("ip", "remote_ip"), ("country", "country"), ("requester", "requester"),
+            ("err", "status_code"), ("bytes", "bytes_sent"), ("ua", "user_agent"),
+        )),
+    ]
+    return " ".join(part for part in parts if part)
+
+
+def _aggregate_line(source: str, log: dict) -> str:
+    # 압축 단계(log_compression)가 만든 집계 레코드: 반복 횟수와 처음~마지막 시각을 앞에 둔 원래 형식의 한 줄
+    first_seen, last_seen = _time(log), _time({"event_time": log.get("last_seen")})
+    line = _LINE_FORMATS[source](log).split(" ", 2)
+    head = f"{line[0]} x{log['count']} {first_seen}~{last_seen}"
+    return " ".join([head] + line[2:])
+
+
+_LINE_FORMATS = {
+    "cloudtrail": _cloudtrail_line,
+    "vpcflow": _vpcflow_line,
+    "s3accesslog": _s3_line,
+}
+
+
+def compact_log_line(source: str, log: dict) -> str:
+    """
+    로그 하나를 LLM 입력용 한 줄로 직렬화합니다. 집계 레코드는 "x건수 처음~마지막" 머리를 붙입니다.
+    알 수 없는 출처는 값이 있는 필드만 남긴 한 줄 JSON으로 만듭니다.
+    """
+    to_line = _LINE_FORMATS.get(source)
+    if to_line is not None and log.get("aggregate"):
+        return _aggregate_line(source, log)
+    if to_line is not None:
+        return to_line(log)
+    return _compact_json({k: v for k, v in log.items() if v not in _EMPTY and k not in ("_id", "env")})
@@ -0,0 +1,70 @@
+# app/helpers/log_store.py
+
+from datetime import datetime, timedelta, timezone
+from pymongo import MongoClient
+
+# 출처별 DB(cloudtrail, vpcflow, s3accesslog) 안의 단일 로그 컬렉션.
+# 수집 기간과 상관없이 같은 이벤트는 같은 _id(CloudTrail EventId, S3/VPC는 객체 키 + 줄 번호)로
+# 한 번만 저장되고, 조회는 event_time 범위 조건으로 합니다.
+LOG_SOURCES = ("cloudtrail", "vpcflow", "s3accesslog")
+LOG_COLLECTION = "logs"
+TIME_FIELD = "event_time"
+
+# 대시보드 날짜 선택 목록용: 수집을 실행한 기간 기록
+RANGES_DB = "aisaws"
+RANGES_COLLECTION = "collected_ranges"
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """timezone 정보가 있는 datetime을 UTC 기준 naive datetime으로 바꿉니다. (MongoDB Date 저장 형식)"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_date_range(start_date_str: str, end_date_str: str) -> tuple[datetime, datetime]:
+    """
+    "YYYY-MM-DD" 시작/종료 날짜를 [start, end) datetime 구간으로 바꿉니다.
+    종료 날짜 당일을 포함하도록 end에는 하루를 더합니다.
+    """
+    try:
+        start_dt = datetime.strptime(start_date_str, "%Y-%m-%d")
+        end_dt = datetime.strptime(end_date_str, "%Y-%m-%d") + timedelta(days=1)
+    except (TypeError, ValueError):
+        raise ValueError("날짜 형식 오류: YYYY-MM-DD 형태로 입력해야 합니다.")
+    return start_dt, end_dt
+
+
+def time_range_filter(start_date_str: str, end_date_str: str) -> dict:
+    """event_time 인덱스를 타는 [start, end) 범위 조건을 반환합니다."""
+    start_dt, end_dt = parse_date_range(start_date_str, end_date_str)
+    return {TIME_FIELD: {"$gte": start_dt, "$lt": end_dt}}
+
+
+def range_name(start_date_str: str, end_date_str: str) -> str:
+    """수집 기간 이름("YYYY-MM-DD_to_YYYY-MM-DD")을 만듭니다."""
+    return f"{start_date_str}_to_{end_date_str}"
+
+
+def parse_range_name(name: str) -> tuple[str, str]:
+    """"YYYY-MM-DD_to_YYYY-MM-DD" 형식의 기간 이름을 (start, end) 날짜 문자열로 나눕니다."""
+    start, sep, end = name.partition("_to_")
+    if not sep:
+        raise ValueError(f"기간 형식 오류: {name}")
+    parse_date_range(start, end)
+    return start, end
+
+
+def get_log_collection(db_client: MongoClient, source: str):
+    """출처(cloudtrail, vpcflow, s3accesslog)의 로그 컬렉션을 반환합니다."""
+    return db_client[source][LOG_COLLECTION]
+
+
+def record_collected_range(db_client: MongoClient, start_date_str: str, end_date_str: str) -> None:
+    """수집을 실행한 기간을 기록합니다. 같은 기간을 다시 수집하면 시각만 갱신됩니다."""
+    db_client[RANGES_DB][RANGES_COLLECTION].update_one(
+        {"_id": range_name(start_date_str, end_date_str)},
+        {"$set": {"start": start_date_str, "end": end_date_str, "collected_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
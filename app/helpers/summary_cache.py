@@ -0,0 +1,75 @@
+# app/helpers/summary_cache.py
+
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+# 대시보드 요약 응답 캐시 (프로세스 내).
+# 항목마다 조회한 출처별 기간을 함께 보관하고, 수집기가 새 문서를 넣으면
+# 그 문서들의 event_time 구간과 겹치는 항목만 지웁니다.
+MAX_ENTRIES = 64
+
+_lock = threading.Lock()
+_entries: "OrderedDict[tuple, dict]" = OrderedDict()
+# 무효화가 일어날 때마다 증가. 집계 도중 새 로그가 들어왔으면 그 결과는 캐시하지 않습니다.
+_generation = 0
+
+
+def make_etag(body: bytes) -> str:
+    """응답 본문으로 강한 ETag 값을 만듭니다."""
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def get_summary(key: tuple) -> Optional[dict]:
+    """캐시된 {"etag", "body"}를 반환합니다. 없으면 None."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+        return entry
+
+
+def current_generation() -> int:
+    """집계를 시작하기 전에 읽어 두었다가 put_summary()에 넘깁니다."""
+    return _generation
+
+
+def put_summary(key: tuple, ranges: dict, body: bytes, generation: int) -> dict:
+    """
+    요약 응답을 캐시에 넣고 {"etag", "body"}를 반환합니다.
+    generation 이후 무효화가 있었다면 캐시에 넣지 않고 반환만 합니다.
+
+    :param key: 캐시 키 (선택된 기간들)
+    :param ranges: {출처: (start_dt, end_dt)} 이 응답이 읽은 출처별 [start, end) 구간
+    :param body: JSON 응답 본문
+    :param generation: 집계 시작 시점의 current_generation() 값
+    """
+    entry = {"etag": make_etag(body), "body": body, "ranges": ranges}
+    with _lock:
+        if generation != _generation:
+            return entry
+        _entries[key] = entry
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return entry
+
+
+def invalidate_summaries(source: str, first: datetime, last: datetime) -> int:
+    """
+    source에 [first, last] 시각의 문서가 새로 들어왔을 때 호출합니다.
+    해당 출처의 조회 구간이 이와 겹치는 캐시 항목을 지우고, 지운 개수를 반환합니다.
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+        stale = [
+            key for key, entry in _entries.items()
+            if source in entry["ranges"]
+            and entry["ranges"][source][0] <= last and first < entry["ranges"][source][1]
+        ]
+        for key in stale:
+            del _entries[key]
+    return len(stale)
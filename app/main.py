@@ -1,3 +1,6 @@
+import asyncio
+import os
+from dotenv import load_dotenv
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
@@ -7,9 +10,40 @@ from app.routers import analyze
 from app.routers import dashboard
 from app.routers import report
 from app.routers import log
+from app.helpers.log_indexes import sync_all_log_indexes
 
 app = FastAPI()
 
+# 시작 시 백그라운드로 돌리는 작업 (MongoDB 연결이 늦거나 안 돼도 앱 시작을 막지 않음)
+# 작업 객체가 가비지 컬렉션되지 않도록 끝날 때까지 참조를 유지
+_startup_tasks: set = set()
+
+
+def _run_in_background(func, *args) -> None:
+    task = asyncio.create_task(asyncio.to_thread(func, *args))
+    _startup_tasks.add(task)
+    task.add_done_callback(_startup_tasks.discard)
+
+
+def _resume_interrupted_analyses() -> None:
+    try:
+        analyze.resume_interrupted_analyses()
+    except Exception as e:
+        print(f"⚠️ 중단된 분석 작업 확인 실패: {e}")
+
+
+@app.on_event("startup")
+async def provision_log_indexes():
+    # 로그 컬렉션 인덱스 확인·갱신 (정의가 바뀌었으면 다시 생성)
+    load_dotenv()
+    _run_in_background(sync_all_log_indexes, os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+
+
+@app.on_event("startup")
+async def resume_analyses():
+    # 앱 종료로 중단된 분석 작업 재개 (끝난 청크는 요약 캐시에서 채워짐)
+    _run_in_background(_resume_interrupted_analyses)
+
 app.include_router(collector.router)
 app.include_router(analyze.router)
 app.include_router(dashboard.router)  # 👉 chart API용
@@ -1,120 +1,267 @@
 # app/routers/analyze.py
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.helpers.export_log import export_logs
-from app.helpers.llama_index_runner import run_llama_index_analysis
+from app.helpers.analysis_jobs import (
+    ANALYZE_WORKERS, TERMINAL_STATUSES, AnalysisJob, JobCancelled, get_job, run_chunks, submit_job
+)
+from app.helpers.chunk_cache import (
+    chunk_cache_key, find_interrupted_runs, get_chunk_summary, put_chunk_summary, record_analysis_run
+)
+from app.helpers.db_utils import get_mongo_client
+from app.helpers.export_log import iter_merged_logs
+from app.helpers.log_compression import COMPRESS_WINDOW_MINUTES, compress_events
+from app.helpers.llama_index_runner import (
+    ask_stored_logs, chunk_token_budget, count_tokens, custom_llm, ensure_embedded, log_node_id, persist_indexes,
+    run_llama_index_analysis
+)
+from app.helpers.log_serializer import compact_log_line
+from app.helpers.log_store import LOG_SOURCES, parse_date_range
+from datetime import timedelta
+from typing import Optional
 from pathlib import Path
+import asyncio
 import json
+import os
 import traceback
 
 router = APIRouter()
 
-SORT_FIELDS = {
-    "cloudtrail": "EventTime",
-    "vpcflow": "start",
-    "s3accesslog": "time"
-}
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+client = get_mongo_client(MONGODB_URI)
+
+# SSE 엔드포인트가 작업 상태 변화를 확인하는 간격(초)
+SSE_POLL_SECONDS = 0.5
 
 class AnalyzeRequest(BaseModel):
     start: str
     end: str
     prompt: str
 
+class AskRequest(BaseModel):
+    start: str
+    end: str
+    question: str
+    summary: Optional[str] = None
+    model: Optional[str] = None
+
+def run_analysis(job: AnalysisJob) -> dict:
+    """
+    분석 작업을 실행하고 상태를 DB에 기록합니다. 앱이 도중에 종료되어 running으로 남은 작업은
+    다음 시작 시 resume_interrupted_analyses()가 같은 job_id로 다시 실행합니다.
+    """
+    record_analysis_run(client, job.job_id, job.params, "running")
+    try:
+        result = _run_analysis(job)
+    except JobCancelled:
+        record_analysis_run(client, job.job_id, job.params, "cancelled")
+        raise
+    except Exception:
+        record_analysis_run(client, job.job_id, job.params, "failed")
+        raise
+    record_analysis_run(client, job.job_id, job.params, "done")
+    return result
+
+def resume_interrupted_analyses() -> int:
+    """이전 실행에서 끝나지 않은 분석 작업을 다시 등록합니다. 완료된 청크는 캐시에서 바로 채워집니다."""
+    runs = find_interrupted_runs(client)
+    for run in runs:
+        print(f"[INFO] ⏯️ 중단된 분석 작업 재개: {run['_id']} ({run['params'].get('report_id')})")
+        submit_job(run["params"], run_analysis, job_id=run["_id"])
+    return len(runs)
+
+def _run_analysis(job: AnalysisJob) -> dict:
+    """
+    분석 작업 본문 (작업 스레드에서 실행). 로그를 청크로 나눠 워커 풀에서 요약하고 리포트를 저장합니다.
+    """
+    req = job.params
+    report_id = req["report_id"]
+    print(f"[INFO] ▶️ 분석 시작: {report_id} (job {job.job_id})")
+
+    # ✅ 1. 로그 수집: 출처별 정렬 커서를 시간순으로 병합하는 지연 이터레이터
+    # (출처, 로그) 쌍으로 받아 벡터 저장소 노드 id(출처:_id)를 만듦
+    merged_logs = iter_merged_logs(req["start"], req["end"])
+
+    # ✅ 1-1. 압축: 구간(COMPRESS_WINDOW_MINUTES) 안에서 반복되는 이벤트를 건수·처음/마지막 시각·바이트 집계 하나로 접음
+    # 한 번만 나온 이벤트와 실패·쓰기 이벤트는 원본 그대로 넘어감
+    compress_stats = {}
+    events = compress_events(merged_logs, compress_stats)
+
+    # ✅ 2. 슬라이싱 분석: 로그를 한 줄로 압축 직렬화해 모델 컨텍스트의 토큰 예산까지 한 청크에 채움
+    # 청크 요약은 (로그 id, 프롬프트, 모델) 해시로 캐시되므로
+    # 같은 기간·프롬프트를 다시 분석하거나 중단된 작업을 재개하면 끝난 청크는 LLM을 호출하지 않음
+    token_budget = chunk_token_budget(req["prompt"])
+    model = custom_llm.model
+
+    print(f"[INFO] 🔁 슬라이싱 시작: 청크당 {token_budget} 토큰, 동시 분석 {ANALYZE_WORKERS}개")
+
+    def iter_chunks():
+        total_items = 0
+        chunk = []
+        used = 0
+        for source, log in events:
+            line = compact_log_line(source, log)
+            tokens = count_tokens(line) + 1  # 줄 구분자 몫
+            if chunk and used + tokens > token_budget:
+                yield chunk
+                chunk, used = [], 0
+            chunk.append((source, log, line))
+            used += tokens
+            total_items += 1
+            if total_items % 1000 == 0:
+                job.update(logs_read=compress_stats["in"], items_analyzed=total_items)
+        job.update(logs_read=compress_stats["in"], items_analyzed=total_items)
+        if chunk:
+            yield chunk
+
+    def analyze_chunk(index: int, chunk: list) -> str:
+        job.check_cancelled()
+        cache_key = chunk_cache_key((log_node_id(source, log) for source, log, _ in chunk), req["prompt"], model)
+        summary_text = get_chunk_summary(client, cache_key)
+        if summary_text is not None:
+            # 중단 전에 저장되지 못한 임베딩이 있을 수 있으므로 캐시를 써도 임베딩은 확인 (이미 있는 노드는 건너뜀)
+            ensure_embedded(chunk)
+            job.increment("chunks_cached")
+            print(f"[INFO] ♻️ 요약 {index + 1}: 캐시 사용")
+            return f"[요약 {index + 1}]\n{summary_text}"
+
+        print(f"[INFO] 🔍 요약 {index + 1}: 항목 {len(chunk)}건 분석 중...")
+        try:
+            summary_text = run_llama_index_analysis(chunk, req["prompt"]).strip()
+            print(f"[DEBUG] ✅ 요약 {index + 1} 길이: {len(summary_text)}자")
+            put_chunk_summary(client, cache_key, summary_text, model, len(chunk))
+        except Exception as e:
+            summary_text = f"[요약 {index + 1}] 분석 실패: {str(e)}"
+            print(f"[ERROR] ❌ 요약 {index + 1} 실패: {e}")
+        return f"[요약 {index + 1}]\n{summary_text}"
+
+    try:
+        summaries = run_chunks(job, iter_chunks(), analyze_chunk)
+    finally:
+        events.close()
+        merged_logs.close()
+        # 이번 분석에서 새로 임베딩한 로그를 저장 (같은 기간 재분석·후속 질문은 임베딩 없이 검색)
+        saved = persist_indexes()
+        print(f"[INFO] 💾 벡터 저장소 저장: 날짜별 인덱스 {saved}개")
+
+    print(f"[DEBUG] ✅ 총 수집된 로그 수: {job.logs_read}")
+    if compress_stats["out"]:
+        print(f"[INFO] 🗜️ 압축: 로그 {compress_stats['in']}건 → 항목 {compress_stats['out']}건 "
+              f"(집계 {compress_stats['folded']}건, {compress_stats['in'] / compress_stats['out']:.1f}배, "
+              f"구간 {COMPRESS_WINDOW_MINUTES}분)")
+    if not summaries:
+        raise RuntimeError("❌ 수집된 로그가 없습니다.")
+
+    # ✅ 3. 최종 분석 생략: 중간 요약만 반환
+    final_result = "\n\n".join(summaries)
+
+    # ✅ 4. 리포트 저장
+    report = {
+        "report_id": report_id,
+        "start": req["start"],
+        "end": req["end"],
+        "prompt": req["prompt"],
+        "summary": final_result,  # 통합 요약이 아니라 슬라이스 요약 전체
+        "messages": [
+            {"role": "user", "text": req["prompt"]},
+            *[{"role": "assistant", "text": s} for s in summaries]
+        ]
+    }
+
+    try:
+        base_dir = Path(__file__).resolve().parent.parent.parent
+        save_path = base_dir / f"reports/{report_id}.json"
+        save_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with save_path.open("w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] 💾 리포트 저장 완료: {save_path}")
+
+    except Exception as save_err:
+        print(f"[ERROR] ❗ 리포트 저장 실패: {save_err}")
+
+    return {"analysis": final_result, "report_id": report_id}
+
 @router.post("/analyze")
 async def analyze_logs(req: AnalyzeRequest):
+    """
+    분석 작업을 등록하고 곧바로 job_id를 반환합니다. 청크 요약은 워커 풀(ANALYZE_WORKERS개 동시)에서 실행되며,
+    진행 상황은 GET /analyze/{job_id} 또는 SSE(GET /analyze/{job_id}/events)로 확인합니다.
+    """
     try:
-        report_id = f"report_{req.start.replace('-', '')}_{req.end.replace('-', '')}"
-        print(f"[INFO] ▶️ 분석 시작: {report_id}")
-
-        # ✅ 1. 로그 수집 및 정렬
-        logs = export_logs(req.start, req.end)
-        flat_logs = []
-
-        for log_type, entries in logs.items():
-            time_key = SORT_FIELDS.get(log_type)
-            for entry in entries:
-                timestamp = entry.get(time_key)
-                if timestamp:
-                    flat_logs.append({
-                        "log_type": log_type,
-                        "timestamp": timestamp,
-                        "log": entry
-                    })
-
-        sorted_logs = sorted(flat_logs, key=lambda x: x["timestamp"])
-        log_entries = [item["log"] for item in sorted_logs]
-        print(f"[DEBUG] ✅ 총 수집된 로그 수: {len(log_entries)}")
-
-        if not sorted_logs:
-            return {"status": "error", "message": "❌ 수집된 로그가 없습니다."}
-
-        # ✅ 2. 슬라이싱 분석 (중간 저장 포함)
-        chunk_size = 400
-        summaries = []
-        temp_path = Path("temp_chunk_summaries.jsonl")
-
-        if temp_path.exists():
-            temp_path.unlink()  # 이전 결과 삭제
-            print(f"[INFO] 🧹 이전 중간 저장 파일 삭제: {temp_path}")
-
-        print(f"[INFO] 🔁 슬라이싱 시작: chunk_size={chunk_size}, 총 {len(log_entries) // chunk_size + 1}회")
-
-        for i in range(0, len(log_entries), chunk_size):
-            chunk = log_entries[i:i + chunk_size]
-            print(f"[INFO] 🔍 {i + 1} ~ {i + len(chunk)} 로그 분석 중...")
-
-            try:
-                chunk_summary = run_llama_index_analysis(chunk, req.prompt)
-                summary_text = chunk_summary.strip()
-                print(f"[DEBUG] ✅ 요약 {i // chunk_size + 1} 길이: {len(summary_text)}자")
-            except Exception as e:
-                summary_text = f"[요약 {i // chunk_size + 1}] 분석 실패: {str(e)}"
-                print(f"[ERROR] ❌ 요약 {i // chunk_size + 1} 실패: {e}")
-
-            summaries.append(f"[요약 {i // chunk_size + 1}]\n{summary_text}")
-
-            with temp_path.open("a", encoding="utf-8") as f:
-                f.write(json.dumps({
-                    "index": i,
-                    "summary": summary_text
-                }, ensure_ascii=False) + "\n")
-
-        # ✅ 3. 최종 분석 생략: 중간 요약만 반환
-        final_result = "\n\n".join(summaries)
-
-        # ✅ 4. 리포트 저장
-        report = {
-            "report_id": report_id,
-            "start": req.start,
-            "end": req.end,
-            "prompt": req.prompt,
-            "summary": final_result,  # 통합 요약이 아니라 슬라이스 요약 전체
-            "messages": [
-                {"role": "user", "text": req.prompt},
-                *[{"role": "assistant", "text": s} for s in summaries]
-            ]
-        }
+        parse_date_range(req.start, req.end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    report_id = f"report_{req.start.replace('-', '')}_{req.end.replace('-', '')}"
+    job = submit_job({"report_id": report_id, "start": req.start, "end": req.end, "prompt": req.prompt}, run_analysis)
+    return {"status": "queued", "job_id": job.job_id, "report_id": report_id}
 
-        try:
-            base_dir = Path(__file__).resolve().parent.parent.parent
-            save_path = base_dir / f"reports/{report_id}.json"
-            save_path.parent.mkdir(parents=True, exist_ok=True)
+def _get_job_or_404(job_id: str) -> AnalysisJob:
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="분석 작업을 찾을 수 없습니다.")
+    return job
+
+@router.get("/analyze/{job_id}")
+async def get_analysis_job(job_id: str):
+    """분석 작업의 상태, 진행률, 지금까지의 청크 요약, 결과를 반환합니다."""
+    return _get_job_or_404(job_id).snapshot()
+
+@router.post("/analyze/{job_id}/cancel")
+async def cancel_analysis_job(job_id: str):
+    """분석 작업을 취소합니다. 대기 중인 청크는 실행하지 않고, 실행 중인 청크 결과는 버립니다."""
+    job = _get_job_or_404(job_id)
+    return {"cancelled": job.cancel(), "status": job.status}
 
-            with save_path.open("w", encoding="utf-8") as f:
-                json.dump(report, f, ensure_ascii=False, indent=2)
-            print(f"[INFO] 💾 리포트 저장 완료: {save_path}")
+@router.get("/analyze/{job_id}/events")
+async def stream_analysis_job(job_id: str, request: Request):
+    """
+    분석 작업 상태를 Server-Sent Events로 보냅니다. 상태가 바뀔 때마다 snapshot을 한 번씩 보내고,
+    작업이 끝나면(done/failed/cancelled) 마지막 상태를 보낸 뒤 닫습니다.
+    """
+    job = _get_job_or_404(job_id)
 
-        except Exception as save_err:
-            print(f"[ERROR] ❗ 리포트 저장 실패: {save_err}")
+    async def events():
+        version = -1
+        idle = 0.0
+        while not await request.is_disconnected():
+            if job.version != version:
+                snapshot = job.snapshot(with_summaries=False)
+                version = snapshot["version"]
+                idle = 0.0
+                yield f"data: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+                if snapshot["status"] in TERMINAL_STATUSES:
+                    break
+            elif idle >= 15:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(SSE_POLL_SECONDS)
+            idle += SSE_POLL_SECONDS
 
-        return {
-            "status": "success",
-            "analysis": final_result,
-            "report_id": report_id
-        }
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
+@router.post("/ask")
+def ask_logs(req: AskRequest):
+    """
+    분석 때 벡터 저장소에 임베딩된 기간 로그를 검색해 후속 질문에 답합니다.
+    아직 분석하지 않은 날짜는 검색 대상이 없으므로 요약 정보만으로 답합니다.
+    """
+    try:
+        start_dt, end_dt = parse_date_range(req.start, req.end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    days = []
+    day = start_dt
+    while day < end_dt:
+        days.append(day.strftime("%Y-%m-%d"))
+        day += timedelta(days=1)
+
+    try:
+        answer = ask_stored_logs(req.question, LOG_SOURCES, days, model=req.model, context=req.summary)
     except Exception as e:
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"분석 중 오류 발생: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"질문 처리 중 오류 발생: {str(e)}")
+    return {"status": "success", "answer": answer}
@@ -1,15 +1,26 @@
 # app/routers/dashboard.py
 
-from fastapi import APIRouter, Request, Query
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 from motor.motor_asyncio import AsyncIOMotorClient
 from collections import Counter
+from datetime import datetime
+import asyncio
+import json
 import urllib.parse
 import os
 from dotenv import load_dotenv
 import aiohttp
 from fastapi import APIRouter, UploadFile, File
+from app.helpers.log_rollups import (
+    count_pipeline, get_rollup_collection, rollup_match, set_size_pipeline, truncate_date
+)
+from app.helpers.log_store import (
+    LOG_COLLECTION, LOG_SOURCES, RANGES_COLLECTION, RANGES_DB, TIME_FIELD,
+    parse_date_range, parse_range_name, time_range_filter
+)
+from app.helpers.summary_cache import current_generation, get_summary, put_summary
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
@@ -21,11 +32,15 @@ if not MONGO_URI:
     raise RuntimeError("환경 변수 MONGODB_URI가 설정되지 않았습니다.")
 client = AsyncIOMotorClient(MONGO_URI)
 
-db_cloudtrail = client["cloudtrail"]
-db_vpc = client["vpcflow"]
-db_s3 = client["s3accesslog"]
+# 출처별 단일 로그 컬렉션 (기간은 event_time 범위 조건으로 선택)
+cloudtrail_logs = client["cloudtrail"][LOG_COLLECTION]
 
-# 현재 선택된 컬렉션
+# 차트용 시간 단위 집계 컬렉션 (수집 시 갱신)
+cloudtrail_rollups = get_rollup_collection(client, "cloudtrail")
+vpc_rollups = get_rollup_collection(client, "vpcflow")
+s3_rollups = get_rollup_collection(client, "s3accesslog")
+
+# 현재 선택된 기간 ("YYYY-MM-DD_to_YYYY-MM-DD")
 current_collection = {
     "cloudtrail": "2025-05-23_to_2025-05-23",
     "vpcflow": "2025-05-23_to_2025-05-23",
@@ -34,6 +49,13 @@ current_collection = {
 
 @router.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request, collection: str = None):
+    # collection은 기간 이름("YYYY-MM-DD_to_YYYY-MM-DD")이며, 수집한 적 없는 임의 기간도 조회 가능
+    try:
+        if collection:
+            parse_range_name(collection)
+    except ValueError:
+        print(f"⚠️ 잘못된 기간 형식 무시: {collection}")
+        collection = None
     if collection:
         current_collection["cloudtrail"] = collection
         current_collection["vpcflow"] = collection
@@ -47,107 +69,209 @@ async def set_collection(
     vpcflow: str = Query(...),
     s3accesslog: str = Query(...)
 ):
+    try:
+        for name in (cloudtrail, vpcflow, s3accesslog):
+            parse_range_name(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     current_collection["cloudtrail"] = cloudtrail
     current_collection["vpcflow"] = vpcflow
     current_collection["s3accesslog"] = s3accesslog
     return {"message": "✅ 컬렉션 설정 완료", "selected": current_collection}
 
+def range_filter(source: str) -> dict:
+    """선택된 기간을 event_time 범위 조건으로 바꿉니다."""
+    start, end = parse_range_name(current_collection[source])
+    return time_range_filter(start, end)
+
 @router.get("/api/collections/cloudtrail")
 async def list_cloudtrail_collections():
-    collections = await db_cloudtrail.list_collection_names()
-    print(f"📁 클라우드트레일 컬렉션 목록 ({len(collections)}개):")
-    for i, name in enumerate(collections, 1):
-        print(f"{i}. {name}")
+    # 수집을 실행한 기간 목록 (최근 순)
+    docs = await client[RANGES_DB][RANGES_COLLECTION].find({}, {"_id": 1}).sort("collected_at", -1).to_list(None)
+    collections = [doc["_id"] for doc in docs]
+    print(f"📁 수집 기간 목록 ({len(collections)}개)")
     return JSONResponse(content={"collections": collections})
 
+CHART1_GRANULARITIES = ("minute", "hour", "day")
+CHART1_OTHERS = "기타"
+
+async def chart1_data(granularity: str = "hour", by_event_name: bool = False, top: int = 5) -> dict:
+    """
+    CloudTrail 이벤트 수를 시간 구간(minute/hour/day)별로 MongoDB에서 집계해 구간별 건수만 반환합니다.
+    hour/day는 시간 단위 집계(rollups_hourly)를, minute은 원본 로그의 event_time 인덱스를 사용합니다.
+    by_event_name=true이면 건수가 많은 eventName 상위 top개의 구간별 건수(나머지는 "기타")도 함께 반환합니다.
+
+    :return: {"granularity": ..., "buckets": [{"time", "count"}], "by_event_name": {eventName: [{"time", "count"}]}}
+    """
+    if granularity not in CHART1_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity는 {', '.join(CHART1_GRANULARITIES)} 중 하나여야 합니다.")
+    top = max(1, min(top, 20))
+    time_filter = range_filter("cloudtrail")
+
+    if granularity == "minute":
+        bucket_key = {"time": truncate_date("$" + TIME_FIELD, "minute")}
+        if by_event_name:
+            bucket_key["name"] = "$EventName"
+        cursor = cloudtrail_logs.aggregate([
+            {"$match": time_filter},
+            {"$group": {"_id": bucket_key, "count": {"$sum": 1}}},
+        ])
+    else:
+        bucket_key = {"time": truncate_date("$hour", granularity)}
+        if by_event_name:
+            bucket_key["name"] = "$value"
+        cursor = cloudtrail_rollups.aggregate([
+            rollup_match("EventName", time_filter),
+            {"$group": {"_id": bucket_key, "count": {"$sum": "$count"}}},
+        ])
+    rows = await cursor.to_list(None)
+
+    def iso(dt):
+        # event_time은 UTC 기준 BSON Date이므로 "Z"를 붙여 반환
+        return dt.isoformat() + "Z" if isinstance(dt, datetime) else dt
+
+    totals = Counter()
+    for row in rows:
+        totals[row["_id"]["time"]] += row["count"]
+    result = {
+        "granularity": granularity,
+        "buckets": [{"time": iso(t), "count": totals[t]} for t in sorted(totals)],
+    }
+
+    if by_event_name:
+        name_totals = Counter()
+        for row in rows:
+            name_totals[row["_id"].get("name")] += row["count"]
+        top_names = {name for name, _ in name_totals.most_common(top)}
+        series = {}
+        for row in rows:
+            name = row["_id"].get("name")
+            name = name if name in top_names else CHART1_OTHERS
+            points = series.setdefault(str(name), Counter())
+            points[row["_id"]["time"]] += row["count"]
+        result["by_event_name"] = {
+            name: [{"time": iso(t), "count": points[t]} for t in sorted(points)]
+            for name, points in series.items()
+        }
+
+    return result
+
 @router.get("/api/chart1")
-async def chart1():
-    docs = await db_cloudtrail[current_collection["cloudtrail"]].find({}, {"EventTime": 1, "_id": 0}).to_list(None)
-    return JSONResponse([doc["EventTime"] for doc in docs if "EventTime" in doc])
+async def chart1(granularity: str = "hour", by_event_name: bool = False, top: int = 5):
+    return JSONResponse(await chart1_data(granularity, by_event_name, top))
+
+async def chart2_data() -> dict:
+    # 수집 시 갱신된 시간 단위 집계(rollups_hourly)를 합산하므로 원본 로그 수와 무관하게 응답
+    cursor = vpc_rollups.aggregate(count_pipeline("action", range_filter("vpcflow")))
+    result = await cursor.to_list(None)
+    return {doc["_id"]: doc["count"] for doc in result}
 
 @router.get("/api/chart2")
 async def chart2():
-    cursor = db_vpc[current_collection["vpcflow"]].aggregate([
-        {"$group": {"_id": "$action", "count": {"$sum": 1}}}
+    return await chart2_data()
+
+async def chart3_data() -> dict:
+    cursor = s3_rollups.aggregate([
+        *count_pipeline("http_status", range_filter("s3accesslog")),
+        {"$sort": {"count": -1}}
     ])
     result = await cursor.to_list(None)
-    return {doc["_id"]: doc["count"] for doc in result}
+    return {str(doc["_id"] or "unknown"): doc["count"] for doc in result}
 
 @router.get("/api/chart3")
 async def chart3():
-    cursor = db_s3[current_collection["s3accesslog"]].aggregate([
-        {"$group": {"_id": "$status_code", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}}
-    ])
-    result = await cursor.to_list(None)
-    print(f"🔎 error_code 고유값 목록 (총 {len(result)}종):")
-    for i, doc in enumerate(result, 1):
-        code = doc["_id"] if doc["_id"] not in (None, "") else "unknown"
-        print(f"{i}. {repr(code)} - {doc['count']}건")
-    return JSONResponse({str(doc["_id"] or "unknown"): doc["count"] for doc in result})
+    return JSONResponse(await chart3_data())
 
-@router.get("/api/chart4")
-async def chart4():
-    cursor = db_vpc[current_collection["vpcflow"]].aggregate([
-        {"$group": {"_id": "$srcaddr", "count": {"$sum": 1}}},
+async def chart4_data() -> list:
+    cursor = vpc_rollups.aggregate([
+        *count_pipeline("srcaddr", range_filter("vpcflow")),
         {"$sort": {"count": -1}},
         {"$limit": 5}
     ])
     result = await cursor.to_list(None)
     return [{"ip": doc["_id"], "count": doc["count"]} for doc in result if doc["_id"]]
 
+@router.get("/api/chart4")
+async def chart4():
+    return await chart4_data()
+
+async def chart5_data(top: int = 10) -> list:
+    # 객체 키별 요청 수를 DB에서 합산·정렬하고, 반환할 상위 top개만 URL 디코딩
+    top = max(1, min(top, 100))
+    docs = await s3_rollups.aggregate([
+        *count_pipeline("key", range_filter("s3accesslog")),
+        # "-"로 시작하는 값(키 없음 표기)과 null 제외
+        {"$match": {"_id": {"$type": "string", "$regex": "^[^-]"}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": top}
+    ]).to_list(length=None)
+
+    result = [
+        {
+            "original": doc["_id"],
+            "decoded": urllib.parse.unquote(urllib.parse.unquote(doc["_id"])),
+            "count": doc["count"]
+        }
+        for doc in docs
+    ]
+    return result
+
 @router.get("/api/chart5")
-async def get_encoded_request_uris_with_count():
-    s3_col = db_s3[current_collection["s3accesslog"]]
-    raw_docs = await s3_col.find(
-        {"request_uri": {"$exists": True, "$ne": None}},
-        {"_id": 0, "request_uri": 1}
-    ).to_list(length=None)
-
-    uris = []
-    for doc in raw_docs:
-        uri = doc.get("request_uri")
-        if not isinstance(uri, str):
-            continue
-        uri = uri.strip()
-        if uri.startswith("%") or (not uri.startswith("-") and not uri.startswith("%")):
-            uris.append(uri)
-
-    uri_counter = Counter(uris)
-    result = []
-    for encoded_uri, count in uri_counter.items():
-        decoded_uri = urllib.parse.unquote(urllib.parse.unquote(encoded_uri))
-        result.append({"original": encoded_uri, "decoded": decoded_uri, "count": count})
-    result.sort(key=lambda x: x["count"], reverse=True)
-    print(f"📦 유효한 request_uri만 출력 (총 {len(result)}건)")
-    for i, item in enumerate(result[:5], 1):
-        print(f"{i}. {item['decoded']} - {item['count']}회 다운로드")
-    return JSONResponse(content=result)
+async def get_encoded_request_uris_with_count(top: int = 10):
+    return JSONResponse(content=await chart5_data(top))
 
-@router.get("/api/chart6")
-async def chart6():
-    cursor = db_vpc[current_collection["vpcflow"]].aggregate([
-        {"$group": {"_id": "$srcaddr", "unique_ports": {"$addToSet": "$dstport"}}},
-        {"$project": {"srcaddr": "$_id", "num_ports": {"$size": "$unique_ports"}, "_id": 0}},
-        {"$match": {"num_ports": {"$gte": 0}}},
+async def chart6_data() -> list:
+    cursor = vpc_rollups.aggregate([
+        *set_size_pipeline("srcaddr_dstports", range_filter("vpcflow")),
+        {"$project": {"srcaddr": "$_id", "num_ports": "$num_members", "_id": 0}},
         {"$sort": {"num_ports": -1}},
         {"$limit": 10}
     ])
     return await cursor.to_list(None)
 
+@router.get("/api/chart6")
+async def chart6():
+    return await chart6_data()
+
+async def chart7_data(top: int = 250) -> dict:
+    # 국가별 요청 수를 DB에서 합산·정렬하여 상위 top개국만 반환 (기본값은 사실상 전체)
+    top = max(1, min(top, 300))
+    docs = await s3_rollups.aggregate([
+        *count_pipeline("country", range_filter("s3accesslog")),
+        {"$match": {"_id": {"$ne": ""}}},
+        {"$sort": {"count": -1}},
+        {"$limit": top}
+    ]).to_list(None)
+    return {doc["_id"]: doc["count"] for doc in docs}
+
 @router.get("/api/chart7")
-async def chart7():
-    docs = await db_s3[current_collection["s3accesslog"]].find(
-        {"country": {"$exists": True, "$ne": ""}},
-        {"_id": 0, "country": 1}
-    ).to_list(None)
-    countries = [doc["country"] for doc in docs]
-    counter = Counter(countries)
-    print(f"🌍 국가별 요청 수 (총 {len(counter)}개국):")
-    for country, count in counter.items():
-        print(f"- {country}: {count}건")
-    return JSONResponse(content=counter)
+async def chart7(top: int = 250):
+    return JSONResponse(content=await chart7_data(top))
+
+@router.get("/api/dashboard-summary")
+async def dashboard_summary(request: Request):
+    """
+    대시보드의 차트 1~7 데이터를 한 번에 반환합니다. 각 차트 집계는 motor 클라이언트에서 동시에 실행됩니다.
+    결과는 선택된 기간 조합별로 캐시되며(ETag), 수집기가 그 기간에 새 로그를 넣으면 무효화됩니다.
+    요청의 If-None-Match가 현재 ETag와 같으면 본문 없이 304를 반환합니다.
+    """
+    key = tuple(current_collection[source] for source in LOG_SOURCES)
+    entry = get_summary(key)
+    if entry is None:
+        generation = current_generation()
+        ranges = {source: parse_date_range(*parse_range_name(current_collection[source])) for source in LOG_SOURCES}
+        charts = await asyncio.gather(
+            chart1_data(), chart2_data(), chart3_data(), chart4_data(),
+            chart5_data(top=5), chart6_data(), chart7_data(),
+        )
+        summary = {f"chart{i}": data for i, data in enumerate(charts, 1)}
+        body = json.dumps(summary, ensure_ascii=False, default=str).encode("utf-8")
+        entry = put_summary(key, ranges, body, generation)
 
+    headers = {"ETag": entry["etag"], "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == entry["etag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
 
 DISCORD_WEBHOOK = ""  
  # 실제 웹훅 주소로 변경
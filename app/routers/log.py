@@ -1,23 +1,96 @@
 # app/routers/log.py
 
 from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import JSONResponse
-from app.helpers.db_utils import get_logs_by_report_id
+from fastapi.responses import StreamingResponse
+from app.helpers.db_utils import get_mongo_client
+from app.helpers.export_log import (
+    convert_for_json, decode_log_cursor, encode_log_cursor, iter_log_page, report_time_filter
+)
+from app.helpers.log_envelope import ENVELOPE_FIELD
+from app.helpers.log_store import LOG_SOURCES, TIME_FIELD, to_naive_utc
+from datetime import datetime
+from typing import Optional
+import json
 import os
 
 router = APIRouter()
 
-@router.get("/get-log")
-def get_log(report_id: str):
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+client = get_mongo_client(MONGODB_URI)
+
+MAX_PAGE_SIZE = 5000
+
+
+def _parse_time(value: str, name: str) -> datetime:
     try:
-        MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-        logs = get_logs_by_report_id(MONGODB_URI, report_id)
-        if not logs:
-            return JSONResponse(content={"logs": ""})
-        
-        # 너무 많을 경우 제한 (최대 10,000자)
-        #text = "\n".join([str(log) for log in logs])[:50000]
-        text = "\n".join([str(log) for log in logs])
-        return JSONResponse(content={"logs": text})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return to_naive_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name}는 ISO 8601 시각이어야 합니다: {value}")
+
+
+def _split(value: Optional[str]) -> list:
+    return [item.strip() for item in value.split(",") if item.strip()] if value else []
+
+
+@router.get("/get-log")
+def get_log(
+    report_id: str,
+    source: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    ip: Optional[str] = None,
+    event_name: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """
+    리포트 기간의 원본 로그를 시간순 NDJSON(한 줄에 로그 하나)으로 한 페이지씩 스트리밍합니다.
+    각 줄에는 출처(log_type)가 함께 들어가고, 마지막 줄은 {"next_cursor": ...}이며
+    값을 cursor로 다시 넘기면 다음 페이지를 받습니다. (마지막 페이지면 null)
+
+    :param source: 출처 목록 (쉼표 구분, 기본 전체)
+    :param since: 이 시각 이후 로그만 (ISO 8601)
+    :param until: 이 시각 이전 로그만 (ISO 8601)
+    :param ip: 출발지 IP (정규화 필드 env.src_ip)
+    :param event_name: CloudTrail EventName (지정하면 CloudTrail 로그만 조회)
+    :param fields: 반환할 필드 목록 (쉼표 구분, 기본 전체)
+    :param limit: 페이지 크기
+    """
+    query = report_time_filter(report_id)
+    if query is None:
+        raise HTTPException(status_code=400, detail=f"report_id 형식 오류: {report_id}")
+
+    sources = _split(source) or list(LOG_SOURCES)
+    unknown = [name for name in sources if name not in LOG_SOURCES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"알 수 없는 출처: {', '.join(unknown)}")
+    if event_name:
+        sources = [name for name in sources if name == "cloudtrail"]
+        query["EventName"] = event_name
+    sources = [name for name in LOG_SOURCES if name in sources]
+
+    time_range = query[TIME_FIELD]
+    if since:
+        time_range["$gte"] = max(time_range["$gte"], _parse_time(since, "since"))
+    if until:
+        time_range["$lt"] = min(time_range["$lt"], _parse_time(until, "until"))
+    if ip:
+        query[f"{ENVELOPE_FIELD}.src_ip"] = ip
+    if cursor:
+        try:
+            decode_log_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    def stream():
+        count = 0
+        last = None
+        for log_type, doc in iter_log_page(client, query, sources, limit, cursor, _split(fields)):
+            count += 1
+            last = (log_type, doc)
+            yield json.dumps({**convert_for_json(doc), "log_type": log_type}, ensure_ascii=False) + "\n"
+        next_cursor = encode_log_cursor(*last) if count == limit else None
+        yield json.dumps({"next_cursor": next_cursor}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
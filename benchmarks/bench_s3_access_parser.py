@@ -0,0 +1,121 @@
+# benchmarks/bench_s3_access_parser.py
+#
+# S3 서버 액세스 로그 파서 처리량 비교 (기존 shlex 기반 구현 vs 전용 토크나이저)
+#   python benchmarks/bench_s3_access_parser.py [줄 수]
+
+import re
+import shlex
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.collectors.s3_access_parser import parse_s3_log_line  # noqa: E402
+
+SAMPLE_LINES = [
+    '79a59df900b949e55d96a1e698fbacedfd6e09d98eacf8f8d5218e7cd47ef2be awsexamplebucket1 '
+    '[06/Feb/2019:00:00:38 +0000] 192.0.2.3 79a59df900b949e55d96a1e698fbacedfd6e09d98eacf8f8d5218e7cd47ef2be '
+    '3E57427F3EXAMPLE REST.GET.VERSIONING - "GET /awsexamplebucket1?versioning HTTP/1.1" 200 - 113 - 7 - '
+    '"-" "S3Console/0.4" - s9lzHYrFp76ZVxRcpX9+5cjAnEH2ROuNkd2BHfIa6UkFVdtjf5mKR3/eTPFvsiP/XV/VLi31234= '
+    'SigV4 ECDHE-RSA-AES128-GCM-SHA256 AuthHeader awsexamplebucket1.s3.us-west-1.amazonaws.com TLSV1.2 '
+    'arn:aws:s3:us-west-1:123456789012:accesspoint/example-AP Yes',
+    '79a59df900b949e55d96a1e698fbacedfd6e09d98eacf8f8d5218e7cd47ef2be awsexamplebucket1 '
+    '[06/Feb/2019:00:00:38 +0000] 203.0.113.7 - 891CE47D2EXAMPLE REST.GET.OBJECT reports/2019/q1%20summary.pdf '
+    '"GET /awsexamplebucket1/reports/2019/q1%20summary.pdf HTTP/1.1" 403 AccessDenied 243 - 9 - "-" '
+    '"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36" '
+    '- BNaBsXZQQDbssi6xMBdBU2sLt+Yf5kZDmeBUP35sFoKa3sLLeMC78iwEIWxs99CRUrbS4n11234= SigV4 '
+    'ECDHE-RSA-AES128-GCM-SHA256 QueryString awsexamplebucket1.s3.us-west-1.amazonaws.com TLSv1.3 - -',
+    '79a59df900b949e55d96a1e698fbacedfd6e09d98eacf8f8d5218e7cd47ef2be awsexamplebucket1 '
+    '[06/Feb/2019:00:00:39 +0000] 198.51.100.12 arn:aws:iam::123456789012:user/uploader A1206F460EXAMPLE '
+    'REST.PUT.OBJECT uploads/image.png "PUT /uploads/image.png HTTP/1.1" 200 - - 524288 31 12 "-" '
+    '"aws-cli/2.15.0 Python/3.11.6 Linux/6.1 exe/x86_64" - Ke1bUcazaN1jWuUlPJaxF64cQVpUEhoZKEG/hmy/gijN/I1DeWqDfFvnpybfEseEME/u7ME1234= '
+    'SigV4 ECDHE-RSA-AES128-GCM-SHA256 AuthHeader awsexamplebucket1.s3.us-west-1.amazonaws.com TLSv1.2 - -',
+]
+
+
+def legacy_parse_s3_log_line(line: str) -> Optional[dict]:
+    """기존 s3_access_collector.parse_s3_log_line (shlex + re + strptime) 구현"""
+    parts = shlex.split(line)
+    if len(parts) < 18:
+        return None
+
+    def to_int(x):
+        try:
+            return int(x)
+        except:
+            return x
+
+    time_raw = parts[2]
+    if time_raw.startswith("[") and parts[3].startswith("+"):
+        time_combined = f"{time_raw} {parts[3]}"
+        try:
+            dt = datetime.strptime(time_combined.strip("[]"), "%d/%b/%Y:%H:%M:%S %z")
+            iso_time = dt.isoformat()
+        except:
+            iso_time = time_raw
+    else:
+        iso_time = time_raw
+
+    remote_ip = parts[3]
+    requester = parts[4]
+    if remote_ip.startswith("+") or remote_ip == "-":
+        remote_ip = requester if re.match(r"\d+\.\d+\.\d+\.\d+", requester) else None
+
+    user_agent = parts[16] if parts[16] != "-" else None
+    version_id = parts[17] if parts[17] != "-" else None
+    if version_id and version_id.startswith("Mozilla"):
+        user_agent = version_id
+        version_id = None
+
+    return {
+        "bucket_owner": parts[0],
+        "bucket": parts[1],
+        "time": iso_time,
+        "remote_ip": remote_ip,
+        "requester": requester,
+        "request_id": parts[5],
+        "operation": parts[6],
+        "key": parts[7] if parts[7] != "-" else None,
+        "request_uri": parts[8],
+        "http_status": parts[9],
+        "status_code": parts[10] if parts[10] != "-" else None,
+        "bytes_sent": to_int(parts[11]),
+        "object_size": to_int(parts[12]),
+        "total_time": to_int(parts[13]),
+        "turnaround_time": to_int(parts[14]),
+        "referrer": parts[15] if parts[15] != "-" else None,
+        "user_agent": user_agent,
+        "version_id": version_id
+    }
+
+
+def bench(name: str, parse, lines: list) -> float:
+    started = time.perf_counter()
+    for line in lines:
+        parse(line)
+    elapsed = time.perf_counter() - started
+    rate = len(lines) / elapsed
+    print(f"{name:<10} {len(lines):>9,}줄  {elapsed:8.3f}s  {rate:12,.0f} lines/s")
+    return rate
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    lines = [SAMPLE_LINES[i % len(SAMPLE_LINES)] for i in range(total)]
+
+    sample = parse_s3_log_line(SAMPLE_LINES[1])
+    assert sample["remote_ip"] == "203.0.113.7"
+    assert sample["time"] == "2019-02-06T00:00:38+00:00"
+    assert sample["http_status"] == "403" and sample["status_code"] == "AccessDenied"
+    assert sample["user_agent"].startswith("Mozilla/5.0") and sample["tls_version"] == "TLSv1.3"
+
+    legacy_rate = bench("shlex", legacy_parse_s3_log_line, lines)
+    new_rate = bench("tokenizer", parse_s3_log_line, lines)
+    print(f"speedup    x{new_rate / legacy_rate:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# scripts/backfill_rollups.py
+#
+# 시간 단위 집계(rollups_hourly)가 도입되기 전에 수집한 기간의 집계를 원본 로그로 다시 만듭니다.
+# 대시보드 차트 2~7은 집계만 읽으므로, 이전에 수집한 기간은 이 스크립트를 한 번 실행해야 차트가 채워집니다.
+#   python scripts/backfill_rollups.py 2025-05-01 2025-05-31 [출처 ...]
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv  # noqa: E402
+from pymongo import MongoClient  # noqa: E402
+from app.helpers.log_rollups import backfill_rollups  # noqa: E402
+from app.helpers.log_store import LOG_SOURCES, time_range_filter  # noqa: E402
+
+
+def main(argv: list) -> int:
+    if len(argv) < 2:
+        print("사용법: python scripts/backfill_rollups.py 시작일 종료일 [출처 ...]  (날짜는 YYYY-MM-DD)")
+        return 1
+    start, end, sources = argv[0], argv[1], argv[2:] or list(LOG_SOURCES)
+    unknown = [source for source in sources if source not in LOG_SOURCES]
+    if unknown:
+        print(f"❌ 알 수 없는 출처: {', '.join(unknown)} (가능: {', '.join(LOG_SOURCES)})")
+        return 1
+    try:
+        time_filter = time_range_filter(start, end)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    try:
+        for source in sources:
+            written = backfill_rollups(client, source, time_filter)
+            print(f"✅ {source} [{start} ~ {end}] 집계 문서 {written}개 작성")
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
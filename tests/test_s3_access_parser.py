@@ -0,0 +1,53 @@
+# tests/test_s3_access_parser.py
+
+from datetime import datetime
+
+from app.collectors.s3_access_parser import parse_s3_log_line
+
+OWNER = "79a59df900b949e55d96a1e698fbacedfd6e09d98eacf8f8d5218e7cd47ef2be"
+
+
+def make_line(time="[06/Feb/2019:00:00:38 +0000]", remote_ip="192.0.2.3", requester=OWNER,
+              bytes_sent="113", object_size="-", total_time="7", turnaround="-",
+              user_agent='"S3Console/0.4"'):
+    return (
+        f"{OWNER} awsexamplebucket1 {time} {remote_ip} {requester} 3E57427F3EXAMPLE REST.GET.OBJECT "
+        f'photos/cat.jpg "GET /awsexamplebucket1/photos/cat.jpg HTTP/1.1" 200 - {bytes_sent} {object_size} '
+        f'{total_time} {turnaround} "-" {user_agent} - s9lzHYrFp76ZVxRcpX9+5cjAnEH2ROuNkd2BHfIa6UkFVdtjf5mKR3= '
+        "SigV4 ECDHE-RSA-AES128-GCM-SHA256 AuthHeader awsexamplebucket1.s3.us-west-1.amazonaws.com TLSv1.2 - -"
+    )
+
+
+def test_escaped_quotes_in_user_agent():
+    rec = parse_s3_log_line(make_line(user_agent=r'"Mozilla \"x\" y"'))
+
+    assert rec["user_agent"] == 'Mozilla "x" y'
+    assert rec["version_id"] is None
+    assert rec["host_id"].startswith("s9lzHYrFp76")
+    assert rec["signature_version"] == "SigV4"
+    assert rec["tls_version"] == "TLSv1.2"
+
+
+def test_dash_numeric_fields():
+    rec = parse_s3_log_line(make_line(bytes_sent="-", object_size="-", total_time="12", turnaround="-"))
+
+    assert rec["bytes_sent"] is None
+    assert rec["object_size"] is None
+    assert rec["total_time"] == 12
+    assert rec["turnaround_time"] is None
+    assert rec["http_status"] == "200"
+    assert rec["status_code"] is None
+
+
+def test_non_utc_offset():
+    rec = parse_s3_log_line(make_line(time="[06/Feb/2019:09:30:38 +0900]"))
+
+    assert rec["time"] == "2019-02-06T09:30:38+09:00"
+    assert rec["event_time"] == datetime(2019, 2, 6, 0, 30, 38)
+
+
+def test_requester_ip_used_when_remote_ip_missing():
+    rec = parse_s3_log_line(make_line(remote_ip="-", requester="203.0.113.7"))
+
+    assert rec["remote_ip"] == "203.0.113.7"
+    assert rec["requester"] == "203.0.113.7"
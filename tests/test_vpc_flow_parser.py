@@ -0,0 +1,68 @@
+# tests/test_vpc_flow_parser.py
+
+from datetime import datetime
+
+from app.collectors.vpc_flow_parser import parse_vpc_flow_lines
+
+V2_LINE = "2 123456789010 eni-1235b8ca123456789 172.31.16.139 172.31.16.21 20641 22 6 20 4249 1418530010 1418530070 ACCEPT OK"
+
+
+def test_v2_line_without_header():
+    columns = parse_vpc_flow_lines([V2_LINE])
+
+    assert len(columns) == 1
+    assert list(columns.line_nos) == [0]
+    rec = columns.to_records()[0]
+    assert rec["account_id"] == "123456789010"
+    assert rec["interface_id"] == "eni-1235b8ca123456789"
+    assert rec["srcaddr"] == "172.31.16.139"
+    assert rec["srcport"] == 20641
+    assert rec["dstport"] == 22
+    assert rec["protocol"] == "6"
+    assert rec["bytes"] == 4249
+    assert rec["action"] == "ACCEPT"
+    assert columns.event_times() == [datetime(2014, 12, 14, 4, 6, 50)]
+
+
+def test_custom_v5_header():
+    lines = [
+        "version vpc-id srcaddr dstaddr srcport dstport protocol bytes start end action log-status "
+        "tcp-flags pkt-srcaddr flow-direction",
+        "5 vpc-0a1b2c3d 10.0.1.5 10.0.2.9 49152 443 6 1500 1700000000 1700000060 REJECT OK 2 10.0.1.5 egress",
+        "5 vpc-0a1b2c3d 10.0.1.6 10.0.2.9 - - 1 - 1700000000 1700000060 ACCEPT OK - - ingress",
+    ]
+    columns = parse_vpc_flow_lines(lines)
+
+    assert columns.fields[0] == "version"
+    assert list(columns.line_nos) == [1, 2]
+    first, second = columns.to_records()
+    assert first["vpc_id"] == "vpc-0a1b2c3d"
+    assert first["tcp_flags"] == 2
+    assert first["pkt_srcaddr"] == "10.0.1.5"
+    assert first["flow_direction"] == "egress"
+    assert first["action"] == "REJECT"
+    assert second["srcport"] is None
+    assert second["bytes"] is None
+    assert second["pkt_srcaddr"] is None
+    assert "interface_id" not in first
+
+
+def test_nodata_and_skipdata_lines_are_dropped():
+    lines = [
+        V2_LINE,
+        "2 123456789010 eni-1235b8ca123456789 - - - - - - - 1431280876 1431280934 - NODATA",
+        "2 123456789010 eni-11111111aaaaaaaaa - - - - - - - 1431280876 1431280934 - SKIPDATA",
+        V2_LINE.replace("20641", "20642"),
+    ]
+    columns = parse_vpc_flow_lines(lines)
+
+    assert list(columns.line_nos) == [0, 3]
+    assert [rec["srcport"] for rec in columns.to_records()] == [20641, 20642]
+
+
+def test_to_records_slices():
+    lines = [V2_LINE.replace("20641", str(20000 + i)) for i in range(5)]
+    columns = parse_vpc_flow_lines(lines)
+
+    assert [rec["srcport"] for rec in columns.to_records(2, 4)] == [20002, 20003]
+    assert [rec["srcport"] for rec in columns.to_records(4, 10)] == [20004]